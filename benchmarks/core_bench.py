@@ -0,0 +1,148 @@
+"""Tk-free benchmarks: state changes, groups, sequences and preset compilation."""
+import os
+import tempfile
+
+from core.engine import SequenceEngine
+from core.hardware import SimulatedBackend
+from core.presets import compile_preset
+from core.state_manager import StateManager
+
+from .harness import measure, result
+from .synthetic import all_lines, device_names, make_preset, make_sequence
+
+
+def _state_manager(directory, name, **options):
+    """A StateManager, deferred unless told otherwise, with its own state file under ``directory``."""
+    path = os.path.join(directory, name)
+    os.makedirs(path, exist_ok=True)
+    options.setdefault("persistence", "deferred")
+    options.setdefault("flush_interval", 0.5)
+    return StateManager(os.path.join(path, "state.json"), **options)
+
+
+def bench_set_pin_state(directory, quick):
+    results = []
+    for devices in ((1, 4) if quick else (1, 4, 16)):
+        lines = all_lines(device_names(devices))
+        for subscribers in (False, True):
+            for persistence, storage in (("immediate", "snapshot"), ("deferred", "snapshot"), ("deferred", "journal")):
+                # Immediate mode rewrites the state file on every change
+                changes = (500 if quick else 5000) // (10 if persistence == "immediate" else 1)
+                state_manager = _state_manager(
+                    directory,
+                    f"set_pin_state-{devices}-{int(subscribers)}-{persistence}-{storage}",
+                    persistence=persistence,
+                    storage=storage,
+                )
+                if subscribers:
+                    # One subscriber per line, like a fully built device tab per device
+                    for line in lines:
+                        state_manager.subscribe([line], lambda _changes: None)
+                toggle = [0]
+
+                def run():
+                    value = toggle[0] = toggle[0] ^ 1
+                    for index in range(changes):
+                        device, pin = lines[index % len(lines)]
+                        state_manager.set_pin_state(device, pin, (index + value) % 2 == 0)
+
+                samples = measure(run, repeat=3 if quick else 5)
+                state_manager.close()
+                results.append(result(
+                    "state.set_pin_state", samples,
+                    {"devices": devices, "subscribers": subscribers, "persistence": persistence, "storage": storage},
+                    ops_per_call=changes,
+                ))
+    return results
+
+
+def bench_set_many(directory, quick):
+    results = []
+    for devices in ((1, 4) if quick else (1, 4, 16)):
+        lines = all_lines(device_names(devices))
+        state_manager = _state_manager(directory, f"set_many-{devices}")
+        toggle = [False]
+
+        def run():
+            toggle[0] = not toggle[0]
+            state_manager.set_many((device, pin, toggle[0]) for device, pin in lines)
+
+        samples = measure(run, number=20 if quick else 200, repeat=3 if quick else 5)
+        state_manager.close()
+        results.append(result("state.set_many", samples, {"devices": devices, "lines": len(lines)}))
+    return results
+
+
+def bench_apply_group(directory, quick):
+    preset = compile_preset(make_preset(controls=0, devices=4, groups=8, sequences=0))
+    groups = preset.of_type("group")
+    results = []
+    for latency_ms in ((None,) if quick else (None, 1.0)):
+        hardware = SimulatedBackend(latency=latency_ms / 1000.0) if latency_ms else None
+        state_manager = _state_manager(directory, f"apply_group-{latency_ms}", hardware=hardware)
+        engine = SequenceEngine(state_manager)
+
+        def run():
+            for group in groups:
+                engine.apply_group(group)
+
+        samples = measure(run, number=5 if latency_ms else 200, repeat=3 if quick else 5)
+        state_manager.close()
+        results.append(result(
+            "engine.apply_group", samples,
+            {"actions": 8, "hardware_latency_ms": latency_ms or 0},
+            ops_per_call=len(groups),
+        ))
+    return results
+
+
+def bench_sequence_steps(directory, quick):
+    """Per-step overhead of a sequence of set steps and zero waits."""
+    results = []
+    lines = all_lines(device_names(2))
+    for steps in ((100,) if quick else (100, 1000)):
+        control = make_sequence("bench", lines, steps)
+        plan = compile_preset({"layout": {"controls": [control]}}).controls[0].plan
+        state_manager = _state_manager(directory, f"sequence-{steps}")
+        engine = SequenceEngine(state_manager)
+        lag = []
+
+        def run():
+            report = engine.run_sequence(plan)
+            lag.append(report.max_lag_ms())
+
+        samples = measure(run, repeat=3 if quick else 5)
+        state_manager.close()
+        entry = result("engine.sequence_step", samples, {"steps": steps}, ops_per_call=len(plan.steps))
+        entry["max_lag_ms"] = max(lag)
+        results.append(entry)
+    return results
+
+
+def bench_compile_preset(_directory, quick):
+    results = []
+    for controls in ((10, 100) if quick else (10, 100, 1000)):
+        data = make_preset(controls=controls, devices=16 if controls >= 100 else 1, sequence_steps=100)
+        devices = device_names(16)
+        samples = measure(lambda: compile_preset(data, devices), number=5 if quick else 20, repeat=3 if quick else 5)
+        results.append(result("presets.compile", samples, {"controls": controls}))
+    return results
+
+
+BENCHMARKS = (
+    ("state.set_pin_state", bench_set_pin_state),
+    ("state.set_many", bench_set_many),
+    ("engine.apply_group", bench_apply_group),
+    ("engine.sequence_step", bench_sequence_steps),
+    ("presets.compile", bench_compile_preset),
+)
+
+
+def run(quick=False, only=None):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="nigui-bench-") as directory:
+        for name, bench in BENCHMARKS:
+            if only and not any(key in name for key in only):
+                continue
+            results.extend(bench(directory, quick))
+    return results
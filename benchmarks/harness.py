@@ -0,0 +1,83 @@
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+def measure(fn, number=1, repeat=5, setup=None):
+    """Return the seconds per call of ``fn`` for each of ``repeat`` samples of ``number`` calls."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+def result(name, samples, params=None, ops_per_call=1):
+    """Summarise ``samples`` (seconds per call) as microseconds per operation."""
+    per_op = [sample / ops_per_call * 1e6 for sample in samples]
+    median = statistics.median(per_op)
+    return {
+        "name": name,
+        "params": params or {},
+        "samples": len(per_op),
+        "per_op_us": {
+            "min": round(min(per_op), 3),
+            "median": round(median, 3),
+            "mean": round(statistics.fmean(per_op), 3),
+            "max": round(max(per_op), 3),
+        },
+        "ops_per_s": round(1e6 / median, 1) if median > 0 else None,
+    }
+
+
+def skipped(name, reason):
+    return {"name": name, "skipped": reason}
+
+
+def result_key(entry):
+    params = ",".join(f"{key}={value}" for key, value in sorted(entry.get("params", {}).items()))
+    return f"{entry['name']}[{params}]" if params else entry["name"]
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Pair results by name and params and return ``(rows, regressions)``.
+
+    A row is ``(key, baseline_us, current_us, ratio)`` on median time per
+    operation; a regression is a row whose ratio exceeds ``1 + threshold``.
+    """
+    previous = {result_key(entry): entry for entry in baseline.get("results", []) if "per_op_us" in entry}
+    rows = []
+    for entry in current.get("results", []):
+        key = result_key(entry)
+        if "per_op_us" not in entry or key not in previous:
+            continue
+        before = previous[key]["per_op_us"]["median"]
+        after = entry["per_op_us"]["median"]
+        rows.append((key, before, after, after / before if before else None))
+    regressions = [row for row in rows if row[3] is not None and row[3] > 1 + threshold]
+    return rows, regressions
@@ -0,0 +1,85 @@
+import random
+
+from core.port_state import LINES_PER_PORT, PORTS_PER_DEVICE, pin_name
+
+
+LINES_PER_DEVICE = PORTS_PER_DEVICE * LINES_PER_PORT
+
+
+def device_names(count):
+    return [f"Dev{index + 1}" for index in range(count)]
+
+
+def all_lines(devices):
+    """Every ``(device, pin)`` of ``devices``, port by port."""
+    return [
+        (device, pin_name(port, bit))
+        for device in devices
+        for port in range(PORTS_PER_DEVICE)
+        for bit in range(LINES_PER_PORT)
+    ]
+
+
+def make_sequence(label, lines, steps, seed=0):
+    """A sequence of ``steps`` set steps with a zero wait after every eighth one."""
+    rng = random.Random(seed)
+    raw = []
+    for index in range(steps):
+        device, pin = lines[index % len(lines)]
+        raw.append({"action": "set", "device": device, "pin": pin, "state": rng.random() < 0.5})
+        if index % 8 == 7:
+            raw.append({"action": "wait", "seconds": 0})
+    return {"id": label, "type": "sequence", "label": label, "steps": raw}
+
+
+def make_preset(controls=100, devices=1, groups=4, sequences=2, sequence_steps=50, seed=0):
+    """
+    Build preset JSON with ``controls`` I/O controls spread over ``devices``.
+
+    Port 1 lines become inputs and the rest outputs; a break follows every
+    sixteenth control. Lines are reused once every line of every device has
+    a control. Groups switch one port each, and sequences cycle over all
+    output lines.
+    """
+    rng = random.Random(seed)
+    names = device_names(devices)
+    lines = all_lines(names)
+    outputs = [(device, pin) for device, pin in lines if not pin.startswith("p1.")]
+    layout = []
+    for index in range(controls):
+        device, pin = lines[index % len(lines)]
+        control_type = "input" if pin.startswith("p1.") else "output"
+        control = {
+            "id": f"{control_type}_{index}",
+            "type": control_type,
+            "device": device,
+            "pin": pin,
+            "label": f"{device} {pin} #{index}",
+            "on_color": "#4CAF50",
+            "off_color": "#CAC9C8",
+        }
+        if control_type == "input":
+            control["active_level"] = rng.choice(("ACTIVE_HIGH", "ACTIVE_LOW"))
+        layout.append(control)
+        if index % 16 == 15:
+            layout.append({"id": f"break_{index}", "type": "break"})
+    for index in range(groups):
+        device = names[index % len(names)]
+        port = 0 if index % 2 == 0 else 2
+        layout.append({
+            "id": f"group_{index}",
+            "type": "group",
+            "label": f"Group {index}",
+            "actions": [
+                {"device": device, "pin": pin_name(port, bit), "state": bool((index + bit) % 2)}
+                for bit in range(LINES_PER_PORT)
+            ],
+        })
+    for index in range(sequences):
+        layout.append(make_sequence(f"sequence_{index}", outputs, sequence_steps, seed + index))
+    return {
+        "title": f"Synthetic {controls} controls / {devices} devices",
+        "info": "Generated by benchmarks.synthetic",
+        "event_log": True,
+        "layout": {"controls": layout},
+    }
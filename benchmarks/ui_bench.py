@@ -0,0 +1,184 @@
+"""
+Tk benchmarks: control panel build, device tab build and refresh latency.
+
+They need a display; on a headless machine run the suite under a virtual
+one, e.g. ``xvfb-run -a python run_benchmarks.py``.
+"""
+import json
+import os
+import tempfile
+import tkinter as tk
+from tkinter import ttk
+
+from core.event_log import EventLog
+from core.state_manager import StateManager
+from tabs.control_panel_tab import GroupControl, create_control_panel_tab
+from tabs.device_tab import build_device_tab
+from tabs.refresh_scheduler import RefreshScheduler
+
+from .harness import measure, result, skipped
+from .synthetic import device_names, make_preset
+
+
+class _Session:
+    """A withdrawn root with a notebook, state manager and event log."""
+
+    def __init__(self, directory):
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.root.refresh_scheduler = RefreshScheduler(self.root, max_fps=1000)
+        self.notebook = ttk.Notebook(self.root)
+        self.notebook.pack(fill="both", expand=True)
+        self.state_manager = StateManager(os.path.join(directory, "state.json"), persistence="deferred")
+        self.event_log = EventLog(capacity=10000)
+        self.directory = directory
+        self._presets = 0
+
+    def write_preset(self, data):
+        self._presets += 1
+        path = os.path.join(self.directory, f"preset-{self._presets}.json")
+        with open(path, "w") as f:
+            json.dump(data, f)
+        return path
+
+    def paint(self):
+        """Run pending repaints and geometry so timings include the work Tk would do."""
+        self.root.refresh_scheduler.flush()
+        self.root.update_idletasks()
+
+    def close(self):
+        self.state_manager.close()
+        self.root.destroy()
+
+
+def bench_control_panel_build(session, quick):
+    """Cold build of a preset into an empty panel, then a labels-only re-apply."""
+    results = []
+    empty = session.write_preset({"title": "empty", "layout": {"controls": []}})
+    # A fixed config so the numbers do not depend on the config.json of whoever runs this
+    config = {"devices": device_names(1), "selected_preset": empty}
+    panel = create_control_panel_tab(session.notebook, session.state_manager, session.event_log, config)
+    for controls in ((10, 100) if quick else (10, 100, 1000)):
+        names = device_names(max(1, controls // 24))
+        data = make_preset(controls=controls, devices=len(names))
+        path = session.write_preset(data)
+        relabelled = dict(data, layout={"controls": [
+            dict(control, label=f"{control.get('label', '')}*") if "label" in control else control
+            for control in data["layout"]["controls"]
+        ]})
+        relabelled_path = session.write_preset(relabelled)
+
+        def build():
+            panel.rebuild_from_preset(path, names)
+            session.paint()
+
+        def clear():
+            panel.rebuild_from_preset(empty)
+            session.paint()
+
+        samples = measure(build, repeat=3 if quick else 5, setup=clear)
+        results.append(result("ui.control_panel_build", samples, {"controls": controls}))
+
+        toggle = [False]
+
+        def reapply():
+            toggle[0] = not toggle[0]
+            panel.rebuild_from_preset(relabelled_path if toggle[0] else path)
+            session.paint()
+
+        samples = measure(reapply, number=2, repeat=3 if quick else 5, setup=build)
+        results.append(result("ui.control_panel_reapply", samples, {"controls": controls}))
+    return results
+
+
+def bench_device_tab_build(session, quick):
+    frames = []
+
+    def build():
+        frame = ttk.Frame(session.notebook)
+        session.notebook.add(frame, text="bench")
+        build_device_tab(frame, "Dev1", session.state_manager)
+        session.paint()
+        frames.append(frame)
+
+    def teardown():
+        while frames:
+            frames.pop().destroy()
+
+    samples = measure(build, number=5 if quick else 20, repeat=3 if quick else 5, setup=teardown)
+    teardown()
+    return [result("ui.device_tab_build", samples)]
+
+
+def bench_refresh_latency(session, quick):
+    """Time from one pin change to every subscribed widget repainted."""
+    results = []
+    for devices in ((1, 4) if quick else (1, 4, 16)):
+        names = device_names(devices)
+        frames = []
+        for name in names:
+            frame = ttk.Frame(session.notebook)
+            session.notebook.add(frame, text=name)
+            build_device_tab(frame, name, session.state_manager)
+            frames.append(frame)
+        session.paint()
+        toggle = [False]
+
+        def change():
+            toggle[0] = not toggle[0]
+            for name in names:
+                session.state_manager.set_pin_state(name, "p0.0", toggle[0])
+            session.paint()
+
+        samples = measure(change, number=20 if quick else 100, repeat=3 if quick else 5)
+        results.append(result("ui.refresh_per_change", samples, {"device_tabs": devices}, ops_per_call=devices))
+        for frame in frames:
+            frame.destroy()
+    return results
+
+
+def bench_group_control(session, quick):
+    frame = ttk.Frame(session.notebook)
+    session.notebook.add(frame, text="groups")
+    port_masks = {("Dev1", 0): (0xFF, 0x55)}
+    inverse = {("Dev1", 0): (0xFF, 0xAA)}
+    group = GroupControl(frame, session.state_manager, "bench", port_masks)
+    other = GroupControl(frame, session.state_manager, "inverse", inverse)
+    group.pack()
+    other.pack()
+    toggle = [False]
+
+    def apply():
+        toggle[0] = not toggle[0]
+        (group if toggle[0] else other).apply_group()
+        session.paint()
+
+    samples = measure(apply, number=20 if quick else 200, repeat=3 if quick else 5)
+    frame.destroy()
+    return [result("ui.group_apply", samples, {"actions": 8})]
+
+
+BENCHMARKS = (
+    ("ui.control_panel_build", bench_control_panel_build),
+    ("ui.device_tab_build", bench_device_tab_build),
+    ("ui.refresh_per_change", bench_refresh_latency),
+    ("ui.group_apply", bench_group_control),
+)
+
+
+def run(quick=False, only=None):
+    selected = [(name, bench) for name, bench in BENCHMARKS if not only or any(key in name for key in only)]
+    if not selected:
+        return []
+    with tempfile.TemporaryDirectory(prefix="nigui-bench-ui-") as directory:
+        try:
+            session = _Session(directory)
+        except tk.TclError as exc:
+            return [skipped(name, f"no display: {exc}") for name, _bench in selected]
+        try:
+            results = []
+            for _name, bench in selected:
+                results.extend(bench(session, quick))
+        finally:
+            session.close()
+    return results
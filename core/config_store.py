@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+
+from .presets import PresetError, compile_preset
+from .state_manager import write_text_atomic
+
+
+CONFIG_FILE = "config.json"
+PRESETS_DIR = "presets"
+DEFAULT_PRESET = "default.json"
+
+
+class JsonFileCache:
+    """
+    Parses each JSON file once and hands the same object to every caller.
+
+    A file is re-parsed only when its ``(mtime_ns, size)`` changes. Returned
+    data is shared, so callers must copy before modifying it.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.parses = 0
+
+    def load(self, path):
+        """Return the parsed file, or ``{}`` if it does not exist."""
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(key)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return {}
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+        with open(key, "r") as f:
+            data = json.load(f) or {}
+        with self._lock:
+            self._entries[key] = (signature, data)
+            self.parses += 1
+        return data
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+
+_cache = JsonFileCache()
+_compiled = {}  # path -> (parsed data, devices, Preset)
+
+
+def load_config(path=CONFIG_FILE):
+    return _cache.load(path)
+
+
+def save_config(config, path=CONFIG_FILE):
+    write_text_atomic(path, json.dumps(config, indent=2))
+    _cache.invalidate(path)
+
+
+def preset_path(name):
+    """Resolve a preset file name to its path in ``PRESETS_DIR``."""
+    return os.path.join(PRESETS_DIR, name)
+
+
+def selected_preset_path(config=None):
+    if config is None:
+        config = load_config()
+    return preset_path(config.get("selected_preset", DEFAULT_PRESET))
+
+
+def load_compiled_preset(path, devices=None):
+    """
+    Return the compiled ``Preset`` for ``path``; raises ``PresetError``,
+    also for a file that is not valid JSON.
+
+    The model is rebuilt only when the file is re-parsed or ``devices``
+    changes.
+    """
+    try:
+        data = _cache.load(path)
+    except json.JSONDecodeError as exc:
+        raise PresetError(
+            [("$", f"invalid JSON at line {exc.lineno} column {exc.colno}: {exc.msg}")],
+            source=os.path.basename(path),
+        ) from None
+    devices = tuple(devices) if devices is not None else None
+    key = os.path.abspath(path)
+    entry = _compiled.get(key)
+    if entry is not None and entry[0] is data and entry[1] == devices:
+        return entry[2]
+    preset = compile_preset(data, devices, source=os.path.basename(path))
+    _compiled[key] = (data, devices, preset)
+    return preset
+
+
+def list_presets():
+    return sorted(f for f in os.listdir(PRESETS_DIR) if f.endswith(".json"))
@@ -0,0 +1,146 @@
+import threading
+import time
+
+from .pin_locks import PinLockManager
+from .sequence import SequenceReport
+
+
+class SequenceEngine:
+    """
+    Runs preset groups and compiled sequences against a ``StateManager``.
+
+    Everything runs on the calling thread with no Tk dependency; waits use
+    absolute monotonic deadlines and ``wait_for`` steps block on the pin's
+    change notification. Each run holds the pins it writes in
+    ``pin_locks``, so ``run_parallel`` only serializes sequences that share
+    a pin.
+    """
+
+    def __init__(self, state_manager, log_callback=None, pin_locks=None):
+        self.state_manager = state_manager
+        self.log_callback = log_callback
+        self.pin_locks = pin_locks if pin_locks is not None else PinLockManager()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Abort running sequences at their next wait."""
+        self._stop.set()
+
+    def _log(self, message, event_type="sequence", **fields):
+        if self.log_callback is not None:
+            self.log_callback(message, event_type=event_type, **fields)
+
+    def apply_group(self, group):
+        """Apply a compiled group control's actions in one transaction."""
+        start = time.monotonic()
+        with self.state_manager.batch():
+            for (dev, port), (mask, value) in group.port_masks.items():
+                self.state_manager.write_port(dev, port, value, mask, force=True)
+        self._log(f"Group applied: {group.label}", "group")
+        return {
+            "label": group.label,
+            "type": "group",
+            "outcome": "applied",
+            "duration_s": time.monotonic() - start,
+        }
+
+    def run_parallel(self, plans):
+        """Run ``plans`` on one thread each and return their reports in order."""
+        reports = [None] * len(plans)
+
+        def run(index, plan):
+            reports[index] = self.run_sequence(plan)
+
+        threads = [
+            threading.Thread(target=run, args=(index, plan), name=f"sequence-{plan.label}", daemon=True)
+            for index, plan in enumerate(plans)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return reports
+
+    def run_sequence(self, plan):
+        """Run ``plan`` to completion and return its ``SequenceReport``."""
+        report = SequenceReport(plan.label)
+        self.pin_locks.acquire(report, plan.write_pins)
+        try:
+            self._run_plan(plan, report)
+        finally:
+            self.pin_locks.release(report)
+        return report
+
+    def _run_plan(self, plan, report):
+        self._log(f"Sequence started: {plan.label}")
+        t0 = time.monotonic()
+        deadline = t0
+        outcome = "completed"
+        for step in plan.steps:
+            delay = deadline - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                outcome = "stopped"
+                break
+            entry = report.record(step, deadline - t0, time.monotonic() - t0)
+            if step.action == "set":
+                with self.state_manager.batch():
+                    for (dev, port), (mask, value) in step.port_masks.items():
+                        self.state_manager.write_port(dev, port, value, mask)
+                for dev, pin, state in step.sets:
+                    self._log(f"Sequence {plan.label}: set {dev} {pin} -> {state}", "sequence_step", device=dev, pin=pin)
+            elif step.action == "wait":
+                self._log(f"Sequence {plan.label}: wait {step.seconds}s", "sequence_step")
+                deadline += step.seconds
+            elif step.action == "wait_for":
+                met, met_at = self._wait_for(step, deadline)
+                entry["outcome"] = "met" if met else "timeout"
+                if met_at is not None:
+                    entry["duration_ms"] = round((met_at - deadline) * 1000.0, 3)
+                    deadline = met_at
+                if met:
+                    self._log(
+                        f"Sequence {plan.label}: condition met {step.device} {step.pin} == {step.state}",
+                        "sequence_step", device=step.device, pin=step.pin,
+                    )
+                else:
+                    outcome = "stopped" if self._stop.is_set() else "timeout"
+                    self._log(
+                        f"Sequence {plan.label}: timeout waiting for {step.device} {step.pin}",
+                        "timeout", device=step.device, pin=step.pin,
+                    )
+                    break
+        if outcome == "completed":
+            # A trailing wait still counts: hold the pins until its deadline
+            delay = deadline - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                outcome = "stopped"
+        report.finish(outcome, time.monotonic() - t0)
+        self._log(
+            f"Sequence finished: {plan.label} ({report.summary()})",
+            outcome=outcome, max_lag_ms=report.max_lag_ms(),
+        )
+
+    def _wait_for(self, step, step_start):
+        """Return ``(met, met_at)``; ``met_at`` is None if no waiting was needed."""
+        condition = threading.Event()
+
+        def on_change(changes):
+            if any(value == step.state for _dev, _pin, value in changes):
+                condition.set()
+
+        token = self.state_manager.subscribe([(step.device, step.pin)], on_change)
+        try:
+            if self.state_manager.get_pin_state(step.device, step.pin) == step.state:
+                return True, None
+            while not self._stop.is_set():
+                wait = 0.1  # upper bound only, so stop() is noticed
+                if step.timeout > 0:
+                    remaining = step_start + step.timeout - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    wait = min(wait, remaining)
+                if condition.wait(wait):
+                    return True, time.monotonic()
+            return False, time.monotonic()
+        finally:
+            self.state_manager.unsubscribe(token)
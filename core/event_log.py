@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+EVENT_TYPES = ("pin_change", "group", "sequence", "sequence_step", "timeout", "stall", "info")
+
+
+class EventRecord:
+    """One logged event. ``t_ns`` is ``time.monotonic_ns()``, ``wall`` is ``time.time()``."""
+
+    __slots__ = ("seq", "t_ns", "wall", "type", "device", "pin", "message", "data")
+
+    FIELDS = ("seq", "t_ns", "wall", "type", "device", "pin", "message")
+
+    def __init__(self, seq, event_type, message, device=None, pin=None, data=None):
+        self.seq = seq
+        self.t_ns = time.monotonic_ns()
+        self.wall = time.time()
+        self.type = event_type
+        self.device = device
+        self.pin = pin
+        self.message = message
+        self.data = data
+
+    def to_dict(self):
+        record = {field: getattr(self, field) for field in self.FIELDS}
+        if self.data:
+            record["data"] = self.data
+        return record
+
+    def format(self):
+        stamp = time.strftime("%H:%M:%S", time.localtime(self.wall))
+        return f"[{stamp}.{int(self.wall * 1000) % 1000:03d}] {self.message}"
+
+
+class RotatingJsonlWriter:
+    """Appends JSON lines to ``path`` and rotates it at ``max_bytes``."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, flush_interval=1.0):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.backups = int(backups)
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a")
+        self._size = self._file.tell()
+        self._last_flush = time.monotonic()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        if self._size + len(line) > self.max_bytes and self._size > 0:
+            self._rotate()
+        self._file.write(line)
+        self._size += len(line)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "w")
+        self._size = 0
+
+    def close(self):
+        self._file.close()
+
+
+class EventLog:
+    """
+    Structured event store indexed by device, pin and event type.
+
+    The newest ``capacity`` records stay in memory. Every record can also be
+    streamed to a rotating JSONL file (``path``). Each index is a deque of
+    sequence numbers in arrival order, so evicting the oldest record is O(1)
+    and ``query`` walks only the smallest matching index, newest first.
+    """
+
+    def __init__(self, capacity=200000, path=None, max_bytes=10 * 1024 * 1024, backups=5):
+        self.capacity = max(1, int(capacity))
+        self._records = {}
+        self._first_seq = 0
+        self._next_seq = 0
+        self._by_type = {}
+        self._by_device = {}
+        self._by_pin = {}
+        self._lock = threading.Lock()
+        self._sink = RotatingJsonlWriter(path, max_bytes, backups) if path else None
+
+    def _indexes(self, record):
+        yield self._by_type, record.type
+        if record.device:
+            yield self._by_device, record.device
+            if record.pin:
+                yield self._by_pin, (record.device, record.pin)
+
+    def record(self, event_type, message, device=None, pin=None, **data):
+        with self._lock:
+            record = EventRecord(self._next_seq, event_type, message, device, pin, data or None)
+            self._records[record.seq] = record
+            self._next_seq += 1
+            for index, key in self._indexes(record):
+                index.setdefault(key, deque()).append(record.seq)
+            if len(self._records) > self.capacity:
+                self._evict_oldest()
+            if self._sink is not None:
+                self._sink.write(record.to_dict())
+        return record
+
+    def _evict_oldest(self):
+        oldest = self._records.pop(self._first_seq)
+        self._first_seq += 1
+        # The oldest record is at the front of every index it belongs to.
+        for index, key in self._indexes(oldest):
+            seqs = index[key]
+            seqs.popleft()
+            if not seqs:
+                del index[key]
+
+    def query(self, event_type=None, device=None, pin=None, text=None, limit=None):
+        """
+        Return matching records, oldest first; ``limit`` keeps the newest ones.
+
+        ``text`` is a plain substring match on the message, applied after
+        the indexed filters.
+        """
+        with self._lock:
+            candidates = []
+            if event_type:
+                candidates.append(self._by_type.get(event_type, ()))
+            if device and pin:
+                candidates.append(self._by_pin.get((device, pin), ()))
+            elif device:
+                candidates.append(self._by_device.get(device, ()))
+            if candidates:
+                seqs = min(candidates, key=len)
+            else:
+                seqs = self._records.keys()
+            matches = []
+            for seq in reversed(seqs):
+                record = self._records[seq]
+                if event_type and record.type != event_type:
+                    continue
+                if device and record.device != device:
+                    continue
+                if pin and record.pin != pin:
+                    continue
+                if text and text not in record.message:
+                    continue
+                matches.append(record)
+                if limit is not None and len(matches) >= limit:
+                    break
+        matches.reverse()
+        return matches
+
+    def __len__(self):
+        return len(self._records)
+
+    def export(self, path, records=None):
+        """Write ``records`` (default: everything in memory) as .csv or JSONL by extension."""
+        if records is None:
+            with self._lock:
+                records = list(self._records.values())
+        with open(path, "w", newline="") as f:
+            if path.lower().endswith(".csv"):
+                writer = csv.writer(f)
+                writer.writerow(EventRecord.FIELDS)
+                for record in records:
+                    writer.writerow([getattr(record, field) for field in EventRecord.FIELDS])
+            else:
+                for record in records:
+                    f.write(json.dumps(record.to_dict(), separators=(",", ":")) + "\n")
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
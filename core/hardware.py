@@ -0,0 +1,122 @@
+import threading
+import time
+
+
+class HardwareBackend:
+    """
+    Digital I/O hardware behind ``StateManager``.
+
+    Backends move whole ports: ``value`` is an int with bit n = line n.
+    """
+
+    def write_port(self, device, port, value):
+        raise NotImplementedError
+
+    def read_port(self, device, port):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimulatedBackend(HardwareBackend):
+    """In-process stand-in for NI devices with a configurable per-call latency."""
+
+    def __init__(self, latency=0.0):
+        self.latency = float(latency or 0.0)
+        self.writes = 0
+        self.reads = 0
+        self._ports = {}
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def write_port(self, device, port, value):
+        self._wait()
+        with self._lock:
+            self._ports[(device, port)] = int(value) & 0xFF
+            self.writes += 1
+
+    def read_port(self, device, port):
+        self._wait()
+        with self._lock:
+            self.reads += 1
+            return self._ports.get((device, port), 0)
+
+    def drive_line(self, device, port, bit, value):
+        """Change a line from the "outside", as a wired input would."""
+        with self._lock:
+            current = self._ports.get((device, port), 0)
+            if value:
+                current |= 1 << bit
+            else:
+                current &= ~(1 << bit)
+            self._ports[(device, port)] = current
+
+
+class NidaqmxBackend(HardwareBackend):
+    """
+    NI-DAQmx backend that keeps one started task open per port.
+
+    Each task spans ``port<n>/line0:7`` so a write or read moves all eight
+    lines in one driver call. A port is used in a single direction at a
+    time; switching direction closes the old task first.
+    """
+
+    def __init__(self):
+        try:
+            import nidaqmx
+            from nidaqmx.constants import LineGrouping
+        except ImportError as exc:
+            raise ImportError("The nidaqmx package is required for the NI hardware backend") from exc
+        self._nidaqmx = nidaqmx
+        self._line_grouping = LineGrouping.CHAN_FOR_ALL_LINES
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def _task(self, device, port, direction):
+        key = (device, port)
+        entry = self._tasks.get(key)
+        if entry is not None:
+            if entry[0] == direction or direction == "in":
+                return entry[1]
+            entry[1].close()
+        task = self._nidaqmx.Task()
+        channel = f"{device}/port{port}/line0:7"
+        if direction == "out":
+            task.do_channels.add_do_chan(channel, line_grouping=self._line_grouping)
+        else:
+            task.di_channels.add_di_chan(channel, line_grouping=self._line_grouping)
+        task.start()
+        self._tasks[key] = (direction, task)
+        return task
+
+    def write_port(self, device, port, value):
+        with self._lock:
+            self._task(device, port, "out").write(int(value) & 0xFF)
+
+    def read_port(self, device, port):
+        # An output port is read back through its DO task.
+        with self._lock:
+            return int(self._task(device, port, "in").read()) & 0xFF
+
+    def close(self):
+        with self._lock:
+            for _direction, task in self._tasks.values():
+                task.close()
+            self._tasks.clear()
+
+
+def create_backend(settings):
+    """Build a backend from the ``hardware`` section of config.json."""
+    settings = settings or {}
+    name = settings.get("backend", "none")
+    if name == "none":
+        return None
+    if name == "simulated":
+        return SimulatedBackend(latency=float(settings.get("latency_ms", 0)) / 1000.0)
+    if name == "nidaqmx":
+        return NidaqmxBackend()
+    raise ValueError(f"Unknown hardware backend: {name}")
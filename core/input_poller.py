@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+
+
+class InputPoller:
+    """
+    Background thread that samples input ports and queues changed lines.
+
+    The watched ports are whatever ``state_manager.input_ports`` holds at
+    each pass. Each device is sampled at ``rates[device]`` Hz (``rate_hz``
+    by default). Only deltas ``(device, port, value, changed_mask)`` are
+    queued; the UI thread applies them with ``drain``. With ``direct=True``
+    (headless use) the poller thread applies them to the state itself.
+
+    A port whose reads start failing, and its recovery, are reported once
+    each through ``log_callback(message, event_type=..., **fields)``, from
+    ``drain`` or, with ``direct=True``, from the poller thread.
+    """
+
+    def __init__(self, state_manager, hardware, rate_hz=50, rates=None, direct=False, log_callback=None):
+        self.state_manager = state_manager
+        self.direct = direct
+        self.log_callback = log_callback
+        self.hardware = hardware
+        self.rate_hz = float(rate_hz)
+        self.rates = dict(rates or {})
+        self.changes = queue.Queue()
+        self.messages = queue.Queue()
+        self._failing = set()
+        self._last = {}
+        self._due = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _interval(self, device):
+        return 1.0 / max(0.1, float(self.rates.get(device, self.rate_hz)))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="input-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            ports = self.state_manager.input_ports
+            now = time.monotonic()
+            for key in [key for key in self._due if key not in ports]:
+                del self._due[key]
+                self._last.pop(key, None)
+                self._failing.discard(key)
+            for key in ports:
+                if self._due.get(key, now) <= now:
+                    self._sample(*key)
+                    self._due[key] = now + self._interval(key[0])
+            next_due = min(self._due.values(), default=now + 1.0 / max(0.1, self.rate_hz))
+            self._stop.wait(max(0.0, next_due - time.monotonic()))
+
+    def _log(self, message, **fields):
+        if self.log_callback is None:
+            return
+        if self.direct:
+            self.log_callback(message, event_type="info", **fields)
+        else:
+            self.messages.put((message, fields))
+
+    def _sample(self, device, port):
+        try:
+            value = self.hardware.read_port(device, port)
+        except Exception as exc:
+            if (device, port) not in self._failing:
+                self._failing.add((device, port))
+                self._log(f"Input read failed for {device}/port{port}: {exc}", device=device, port=port)
+            return
+        if (device, port) in self._failing:
+            self._failing.discard((device, port))
+            self._log(f"Input read recovered for {device}/port{port}", device=device, port=port)
+        last = self._last.get((device, port))
+        if last is None:
+            changed = 0xFF
+        else:
+            changed = last ^ value
+        if changed:
+            self._last[(device, port)] = value
+            if self.direct:
+                self.state_manager.write_port(device, port, value, changed, write_through=False)
+            else:
+                self.changes.put((device, port, value, changed))
+
+    def drain(self):
+        """Apply every queued delta as one batch and log read failures; call from the UI thread."""
+        while True:
+            try:
+                message, fields = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            self.log_callback(message, event_type="info", **fields)
+        count = 0
+        with self.state_manager.batch():
+            while True:
+                try:
+                    device, port, value, changed = self.changes.get_nowait()
+                except queue.Empty:
+                    break
+                self.state_manager.write_port(device, port, value, changed, write_through=False)
+                count += 1
+        return count
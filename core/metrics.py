@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+
+
+class Counter:
+    """A monotonically increasing count."""
+
+    __slots__ = ("name", "value", "_lock")
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+    def snapshot(self):
+        return {"type": "counter", "value": self.value}
+
+
+class Histogram:
+    """
+    Distribution of observed values in power-of-two buckets.
+
+    Recording is a few integer operations under a lock, so it is cheap
+    enough for hot paths; percentiles are estimated from the buckets and
+    are accurate to within a factor of two.
+    """
+
+    __slots__ = ("name", "unit", "count", "total", "min", "max", "_buckets", "_scale", "_lock")
+
+    def __init__(self, name, unit="", resolution=1.0):
+        self.name = name
+        self.unit = unit
+        self._scale = 1.0 / resolution  # values are bucketed in multiples of ``resolution``
+        self._lock = threading.Lock()
+        self.reset()
+
+    def observe(self, value):
+        bucket = int(value * self._scale).bit_length()
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.min = float("inf")
+            self.max = 0.0
+            self._buckets = {}
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the ``fraction`` quantile."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = fraction * self.count
+            seen = 0
+            for bucket in sorted(self._buckets):
+                seen += self._buckets[bucket]
+                if seen >= rank:
+                    return min(self.max, (1 << bucket) / self._scale)
+            return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self):
+        return {
+            "type": "histogram",
+            "unit": self.unit,
+            "count": self.count,
+            "mean": round(self.mean(), 3),
+            "min": round(self.min, 3) if self.count else 0.0,
+            "p50": round(self.percentile(0.5), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "p99": round(self.percentile(0.99), 3),
+            "max": round(self.max, 3),
+        }
+
+
+class MetricsRegistry:
+    """Named counters and histograms shared by the hot paths."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def counter(self, name):
+        return self._get(name, Counter, name)
+
+    def histogram(self, name, unit="", resolution=1.0):
+        return self._get(name, Histogram, name, unit, resolution)
+
+    def _get(self, name, kind, *args):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = kind(*args)
+        return metric
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+        self.started = time.time()
+
+    def snapshot(self):
+        return {
+            "started": self.started,
+            "taken": time.time(),
+            "metrics": {name: metric.snapshot() for name, metric in sorted(self._metrics.items())},
+        }
+
+    def export(self, path):
+        from .state_manager import write_text_atomic  # state_manager records into this module
+
+        snapshot = self.snapshot()
+        write_text_atomic(path, json.dumps(snapshot, indent=2))
+        return snapshot
+
+
+registry = MetricsRegistry()
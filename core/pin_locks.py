@@ -0,0 +1,67 @@
+import threading
+
+
+class PinLockManager:
+    """
+    Per-pin ownership for running sequences.
+
+    A sequence claims every pin it writes, all or nothing, so two sequences
+    never interleave writes on the same line while sequences on disjoint
+    pins run side by side. Listeners get the full locked set after every
+    change, on the thread that made it.
+    """
+
+    def __init__(self):
+        self._owners = {}
+        self._cond = threading.Condition()
+        self._listeners = []
+
+    def conflicts(self, owner, pins):
+        """Return the pins in ``pins`` held by someone other than ``owner``."""
+        with self._cond:
+            return {pin for pin in pins if self._owners.get(pin, owner) is not owner}
+
+    def try_acquire(self, owner, pins):
+        """Claim ``pins`` for ``owner``; return the conflicting pins (empty on success)."""
+        with self._cond:
+            conflicts = {pin for pin in pins if self._owners.get(pin, owner) is not owner}
+            if conflicts:
+                return conflicts
+            for pin in pins:
+                self._owners[pin] = owner
+        self._notify()
+        return set()
+
+    def acquire(self, owner, pins, timeout=None):
+        """Block until every pin in ``pins`` can be claimed; return False on timeout."""
+        with self._cond:
+            free = self._cond.wait_for(
+                lambda: all(self._owners.get(pin, owner) is owner for pin in pins),
+                timeout,
+            )
+            if not free:
+                return False
+            for pin in pins:
+                self._owners[pin] = owner
+        self._notify()
+        return True
+
+    def release(self, owner):
+        with self._cond:
+            for pin in [pin for pin, holder in self._owners.items() if holder is owner]:
+                del self._owners[pin]
+            self._cond.notify_all()
+        self._notify()
+
+    def locked_pins(self):
+        with self._cond:
+            return frozenset(self._owners)
+
+    def add_listener(self, callback):
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _notify(self):
+        locked = self.locked_pins()
+        for callback in list(self._listeners):
+            callback(locked)
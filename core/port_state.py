@@ -0,0 +1,127 @@
+from functools import lru_cache
+
+
+PORTS_PER_DEVICE = 3  # USB-6501: three 8-line ports
+LINES_PER_PORT = 8
+
+
+@lru_cache(maxsize=None)
+def parse_pin(pin):
+    """Return ``(port, bit)`` for a line name like ``"p1.5"``, or None."""
+    if not isinstance(pin, str) or not pin.startswith("p"):
+        return None
+    port, sep, bit = pin[1:].partition(".")
+    if not sep or not port.isdigit() or not bit.isdigit():
+        return None
+    port, bit = int(port), int(bit)
+    if bit >= LINES_PER_PORT:
+        return None
+    return port, bit
+
+
+@lru_cache(maxsize=None)
+def pin_name(port, bit):
+    return f"p{port}.{bit}"
+
+
+def iter_bits(mask):
+    """Yield the bit numbers set in ``mask``, lowest first."""
+    bit = 0
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit += 1
+
+
+def pack_pins(pin_states):
+    """
+    Fold ``(device, pin, state)`` triples into per-port masks.
+
+    Returns ``({(device, port): [mask, value]}, leftovers)`` where
+    ``leftovers`` holds the triples whose pin is not a port line.
+    """
+    ports = {}
+    leftovers = []
+    for device, pin, state in pin_states:
+        position = parse_pin(pin)
+        if position is None:
+            leftovers.append((device, pin, state))
+            continue
+        port, bit = position
+        entry = ports.setdefault((device, port), [0, 0])
+        entry[0] |= 1 << bit
+        if state:
+            entry[1] |= 1 << bit
+        else:
+            entry[1] &= ~(1 << bit)
+    return ports, leftovers
+
+
+class DeviceState:
+    """Line states of one device, packed as one byte per port."""
+
+    __slots__ = ("ports", "extra")
+
+    def __init__(self, num_ports=PORTS_PER_DEVICE):
+        self.ports = bytearray(num_ports)
+        self.extra = None  # values for names that are not port lines
+
+    def _ensure_port(self, port):
+        if port >= len(self.ports):
+            self.ports.extend(bytes(port + 1 - len(self.ports)))
+
+    def read_port(self, port):
+        return self.ports[port] if port < len(self.ports) else 0
+
+    def write_port(self, port, value, mask=0xFF):
+        """Write the bits of ``value`` selected by ``mask``; return the changed bits."""
+        self._ensure_port(port)
+        old = self.ports[port]
+        new = (old & ~mask) | (value & mask)
+        self.ports[port] = new
+        return old ^ new
+
+    def get(self, pin):
+        position = parse_pin(pin)
+        if position is None:
+            return bool(self.extra and self.extra.get(pin, False))
+        port, bit = position
+        return bool(self.read_port(port) >> bit & 1)
+
+    def set(self, pin, value):
+        """Set one line; return True if its value changed."""
+        position = parse_pin(pin)
+        if position is None:
+            if self.extra is None:
+                self.extra = {}
+            changed = self.extra.get(pin, False) != bool(value)
+            self.extra[pin] = bool(value)
+            return changed
+        port, bit = position
+        return bool(self.write_port(port, 0xFF if value else 0, 1 << bit))
+
+    def diff(self, other):
+        """Return ``[(port, changed_bits)]`` for every port that differs."""
+        changes = []
+        for port in range(max(len(self.ports), len(other.ports))):
+            changed = self.read_port(port) ^ other.read_port(port)
+            if changed:
+                changes.append((port, changed))
+        return changes
+
+    def to_dict(self):
+        states = {}
+        for port, value in enumerate(self.ports):
+            for bit in range(LINES_PER_PORT):
+                states[pin_name(port, bit)] = bool(value >> bit & 1)
+        if self.extra:
+            states.update(self.extra)
+        return states
+
+    @classmethod
+    def from_dict(cls, states):
+        device_state = cls()
+        for pin, value in states.items():
+            device_state.set(pin, value)
+        return device_state
@@ -0,0 +1,292 @@
+from types import MappingProxyType
+
+from .port_state import PORTS_PER_DEVICE, pack_pins, parse_pin
+from .sequence import SequenceError, _Frozen, compile_sequence
+
+
+DEFAULT_EVENT_LOG_CAPACITY = 500
+CONTROL_TYPES = ("output", "input", "power", "group", "sequence", "break")
+IO_TYPES = ("output", "input", "break")
+ACTIVE_LEVELS = ("ACTIVE_HIGH", "ACTIVE_LOW")
+
+
+class PresetError(ValueError):
+    """Raised when a preset fails validation; ``errors`` holds ``(json_path, message)`` pairs."""
+
+    def __init__(self, errors, source=""):
+        self.errors = list(errors)
+        self.source = source
+        lines = "\n".join(f"  {path}: {message}" for path, message in self.errors)
+        super().__init__(f"{source or 'preset'}: {len(self.errors)} error(s)\n{lines}")
+
+
+class Line(_Frozen):
+    """A resolved ``device``/``pin`` reference."""
+
+    __slots__ = ("device", "pin", "port", "bit", "device_index")
+
+    def __init__(self, device, pin, port, bit, device_index=None):
+        self._set(device=device, pin=pin, port=port, bit=bit, device_index=device_index)
+
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    @property
+    def key(self):
+        return (self.device, self.pin)
+
+
+class Control(_Frozen):
+    """One validated preset control; fields not used by its type are None."""
+
+    __slots__ = (
+        "id", "type", "path", "label", "line", "available", "on_color", "off_color",
+        "secondary_label", "cooldown_seconds", "active_level", "actions", "port_masks", "plan",
+    )
+
+    def __init__(self, id, type, path, label, line=None, available=None, on_color=None, off_color=None,
+                 secondary_label=None, cooldown_seconds=None, active_level=None, actions=None, plan=None):
+        port_masks = None
+        if actions is not None:
+            packed, _leftovers = pack_pins((line.device, line.pin, state) for line, state in actions)
+            port_masks = MappingProxyType({key: tuple(entry) for key, entry in packed.items()})
+        self._set(
+            id=id, type=type, path=path, label=label, line=line, available=available,
+            on_color=on_color, off_color=off_color, secondary_label=secondary_label,
+            cooldown_seconds=cooldown_seconds, active_level=active_level,
+            actions=actions, port_masks=port_masks, plan=plan,
+        )
+
+    @property
+    def device(self):
+        return self.line.device if self.line is not None else ""
+
+    @property
+    def pin(self):
+        return self.line.pin if self.line is not None else ""
+
+    @property
+    def structure(self):
+        """What the control is wired to; widgets are rebuilt only when this changes."""
+        if self.actions is not None:
+            return tuple((line.key, state) for line, state in self.actions)
+        if self.plan is not None:
+            return tuple(step.describe() for step in self.plan.steps)
+        return self.line.key if self.line is not None else ()
+
+    def options(self):
+        """Appearance keyword arguments shared by widget constructors and ``reconfigure``."""
+        options = {"label": self.label}
+        if self.type in ("output", "input", "power", "group"):
+            options["on_color"] = self.on_color
+            options["off_color"] = self.off_color
+        if self.type in ("output", "power"):
+            options["secondary_label"] = self.secondary_label
+        if self.type == "power":
+            options["cooldown_seconds"] = self.cooldown_seconds
+        elif self.type == "input":
+            options["active_level"] = self.active_level
+        elif self.type == "break":
+            del options["label"]
+        return options
+
+
+class Preset(_Frozen):
+    """A compiled preset: metadata plus its controls in layout order."""
+
+    __slots__ = (
+        "source", "title", "info", "window", "event_log", "event_log_capacity",
+        "controls", "by_id", "input_ports", "warnings",
+    )
+
+    def __init__(self, source, title, info, window, event_log, event_log_capacity, controls, warnings=()):
+        controls = tuple(controls)
+        self._set(
+            source=source, title=title, info=info, window=window,
+            event_log=event_log, event_log_capacity=event_log_capacity,
+            controls=controls,
+            by_id=MappingProxyType({control.id: control for control in controls}),
+            input_ports=frozenset(
+                (control.line.device, control.line.port) for control in controls if control.type == "input"
+            ),
+            warnings=tuple(warnings),
+        )
+
+    def of_type(self, *types):
+        return [control for control in self.controls if control.type in types]
+
+    def has(self, *types):
+        return any(control.type in types for control in self.controls)
+
+
+class _Compiler:
+    def __init__(self, devices, source):
+        self.devices = tuple(devices) if devices is not None else None
+        self.source = source
+        self.errors = []
+        self.warnings = []
+
+    def error(self, path, message):
+        self.errors.append((path, message))
+
+    def string(self, data, key, path, default=None):
+        value = data.get(key, default)
+        if value is not None and not isinstance(value, str):
+            self.error(f"{path}.{key}", f"expected a string, got {value!r}")
+            return default
+        return value
+
+    def number(self, data, key, path, default=0):
+        value = data.get(key, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            self.error(f"{path}.{key}", f"expected a non-negative number, got {value!r}")
+            return default
+        return value
+
+    def line(self, data, path):
+        device = data.get("device", "")
+        pin = data.get("pin", "")
+        if not device or not isinstance(device, str):
+            self.error(f"{path}.device", f"expected a device name, got {device!r}")
+            return None
+        position = parse_pin(pin)
+        if position is None or position[0] >= PORTS_PER_DEVICE:
+            self.error(f"{path}.pin", f"invalid pin {pin!r}")
+            return None
+        device_index = None
+        if self.devices is not None:
+            if device in self.devices:
+                device_index = self.devices.index(device)
+            else:
+                self.warnings.append((f"{path}.device", f"device {device!r} is not configured"))
+        return Line(device, pin, position[0], position[1], device_index)
+
+    def control(self, data, path, index):
+        if not isinstance(data, dict):
+            self.error(path, f"expected an object, got {type(data).__name__}")
+            return None
+        control_type = data.get("type", "")
+        if not isinstance(control_type, str) or control_type.lower() not in CONTROL_TYPES:
+            self.error(f"{path}.type", f"unknown control type {control_type!r}")
+            return None
+        control_type = control_type.lower()
+        control_id = self.string(data, "id", path) or f"#{index}"
+        fields = {"label": self.string(data, "label", path, control_id)}
+        if control_type in ("output", "input", "power"):
+            fields["line"] = self.line(data, path)
+            if fields["line"] is None:
+                return None
+            if self.devices is not None:
+                fields["available"] = fields["line"].device_index is not None
+            fields["on_color"] = self.string(data, "on_color", path)
+            fields["off_color"] = self.string(data, "off_color", path)
+        if control_type in ("output", "power"):
+            secondary = data.get("secondary_label")
+            if secondary is not None:
+                if not isinstance(secondary, dict):
+                    self.error(f"{path}.secondary_label", "expected an object with 'on' and 'off'")
+                    secondary = None
+                else:
+                    secondary = MappingProxyType(dict(secondary))
+            fields["secondary_label"] = secondary
+        if control_type == "power":
+            fields["cooldown_seconds"] = int(self.number(data, "cooldown_seconds", path))
+        elif control_type == "input":
+            level = str(data.get("active_level", "ACTIVE_HIGH") or "ACTIVE_HIGH").upper()
+            if level not in ACTIVE_LEVELS:
+                self.error(f"{path}.active_level", f"expected one of {', '.join(ACTIVE_LEVELS)}, got {level!r}")
+            fields["active_level"] = level
+        elif control_type == "group":
+            fields["on_color"] = self.string(data, "on_color", path, "#4CAF50")
+            fields["off_color"] = self.string(data, "off_color", path, "#cac9c8")
+            actions = data.get("actions", [])
+            if not isinstance(actions, list):
+                self.error(f"{path}.actions", "expected a list")
+                actions = []
+            resolved = []
+            for action_index, action in enumerate(actions):
+                action_path = f"{path}.actions[{action_index}]"
+                if not isinstance(action, dict):
+                    self.error(action_path, f"expected an object, got {type(action).__name__}")
+                    continue
+                line = self.line(action, action_path)
+                if line is not None:
+                    resolved.append((line, bool(action.get("state", False))))
+            fields["actions"] = tuple(resolved)
+        elif control_type == "sequence":
+            steps = data.get("steps", [])
+            if not isinstance(steps, list) or not all(isinstance(step, dict) for step in steps):
+                self.error(f"{path}.steps", "expected a list of objects")
+                return None
+            try:
+                fields["plan"] = compile_sequence(fields["label"], steps, path=f"{path}.steps")
+            except SequenceError as exc:
+                self.error(exc.where, exc.message)
+                return None
+            for step_index, step in enumerate(steps):
+                if step.get("device") and self.devices is not None and step["device"] not in self.devices:
+                    self.warnings.append(
+                        (f"{path}.steps[{step_index}].device", f"device {step['device']!r} is not configured")
+                    )
+        elif control_type == "break":
+            fields["label"] = ""
+        return Control(control_id, control_type, path, **fields)
+
+    def preset(self, data):
+        if not isinstance(data, dict):
+            raise PresetError([("$", "expected an object")], self.source)
+        layout = data.get("layout", {})
+        controls = layout.get("controls", []) if isinstance(layout, dict) else None
+        if not isinstance(controls, list):
+            self.error("$.layout.controls", "expected a list")
+            controls = []
+        compiled = []
+        seen = {}
+        for index, raw in enumerate(controls):
+            path = f"$.layout.controls[{index}]"
+            control = self.control(raw, path, index)
+            if control is None:
+                continue
+            if control.id in seen:
+                self.error(f"{path}.id", f"duplicate id {control.id!r}, first used at {seen[control.id]}")
+                continue
+            seen[control.id] = path
+            compiled.append(control)
+
+        window = data.get("window", {})
+        width, height = (window.get("width"), window.get("height")) if isinstance(window, dict) else (None, None)
+        if not (isinstance(width, int) and isinstance(height, int)):
+            width = height = None
+        capacity = data.get("event_log_capacity", DEFAULT_EVENT_LOG_CAPACITY)
+        if isinstance(capacity, bool) or not isinstance(capacity, int) or capacity < 1:
+            self.error("$.event_log_capacity", f"expected a positive integer, got {capacity!r}")
+            capacity = DEFAULT_EVENT_LOG_CAPACITY
+        title = self.string(data, "title", "$", "")
+        info = self.string(data, "info", "$", "")
+
+        if self.errors:
+            raise PresetError(self.errors, self.source)
+        return Preset(
+            self.source,
+            title,
+            info,
+            (width, height) if width is not None else None,
+            bool(data.get("event_log", False)),
+            capacity,
+            compiled,
+            self.warnings,
+        )
+
+
+def compile_preset(data, devices=None, source=""):
+    """
+    Validate raw preset JSON and build an immutable ``Preset``.
+
+    Every problem is collected before raising ``PresetError``, each tagged
+    with its JSON path (``$.layout.controls[3].pin``). When ``devices`` is
+    given, lines are resolved to device indices and references to other
+    devices are returned in ``Preset.warnings`` and leave the control
+    ``available=False``.
+    """
+    return _Compiler(devices, source).preset(data)
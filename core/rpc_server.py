@@ -0,0 +1,436 @@
+"""
+Local JSON-lines server for driving pins from scripts.
+
+Each request is one line ``{"id": 1, "method": "set", "params": {...}}``
+and gets one reply line ``{"id": 1, "result": ...}`` or
+``{"id": 1, "error": "..."}``, in request order. Methods:
+
+    ping                                        -> "pong"
+    get        {"device", "pin"}                -> bool
+               {"device", "port"}               -> int
+               {"pins": [[device, pin], ...]}   -> [bool, ...]
+    set        {"device", "pin", "value"}       -> null
+    write_port {"device", "port", "value", "mask"} -> [[device, pin, value], ...] changed
+    batch      {"changes": [[device, pin, value], ...]} -> null, one transaction
+    controls                                    -> [{"id", "type", "label"}, ...]
+    group      {"id"}                           -> outcome
+    sequence   {"id"}                           -> outcome
+    subscribe  {"pins": [[device, pin], ...]} or {"devices": [device, ...]} -> subscription id
+    unsubscribe {"subscription"}                -> null
+
+A subscription streams ``{"event": "changes", "subscription": id,
+"changes": [[device, pin, value], ...]}`` lines, one per state commit.
+Pipelining requests without waiting for replies gives the highest rate.
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+
+from .engine import SequenceEngine
+from .metrics import registry
+from .port_state import PORTS_PER_DEVICE, LINES_PER_PORT, parse_pin, pin_name
+
+REQUESTS = registry.counter("rpc.requests")
+DRAIN_SIZE = registry.histogram("rpc.ops_per_drain", "ops")
+OUTBOX_LIMIT = 10000  # queued lines per client before a stalled reader is dropped
+
+
+class RpcError(Exception):
+    """A request that cannot be served; its message is sent to the client."""
+
+
+def parse_address(address):
+    """
+    Split ``"unix:/path"``, ``"tcp://host:port"``, ``"host:port"`` or
+    ``"port"`` into ``("unix", path)`` or ``("tcp", (host, port))``.
+    TCP defaults to localhost.
+    """
+    address = str(address)
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if address.startswith("tcp://"):
+        address = address[len("tcp://"):]
+    host, _sep, port = address.rpartition(":")
+    try:
+        return "tcp", (host or "127.0.0.1", int(port))
+    except ValueError:
+        raise ValueError(f"invalid RPC address {address!r}")
+
+
+def _is_socket(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def _line(device, pin):
+    if not isinstance(device, str) or not device:
+        raise RpcError(f"invalid device {device!r}")
+    position = parse_pin(pin)
+    if position is None or position[0] >= PORTS_PER_DEVICE:
+        raise RpcError(f"invalid pin {pin!r}")
+    return device, pin
+
+
+def _port(device, port):
+    if not isinstance(device, str) or not device:
+        raise RpcError(f"invalid device {device!r}")
+    if isinstance(port, bool) or not isinstance(port, int) or not 0 <= port < PORTS_PER_DEVICE:
+        raise RpcError(f"invalid port {port!r}")
+    return device, port
+
+
+def _byte(params, key, default=None):
+    value = params.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 0xFF:
+        raise RpcError(f"'{key}' must be an integer 0-255, got {value!r}")
+    return value
+
+
+class _Connection:
+    """One client: a reader on the server's handler thread and a writer thread."""
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.outbox = queue.Queue(OUTBOX_LIMIT)
+        self.subscriptions = set()
+        self.pending = 0  # requests handed to the UI thread and not yet replied to
+        self.closed = False
+        self._lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write, name="rpc-writer", daemon=True)
+        self._writer.start()
+
+    def send(self, message):
+        """Queue ``message`` for the client; never blocks the caller."""
+        if self.closed:
+            return
+        try:
+            self.outbox.put_nowait(json.dumps(message, separators=(",", ":")) + "\n")
+        except queue.Full:
+            print("RPC client is not reading its replies; disconnecting it")
+            self.close()
+
+    def reply(self, request_id, result=None, error=None):
+        if error is not None:
+            self.send({"id": request_id, "error": error})
+        else:
+            self.send({"id": request_id, "result": result})
+        # Only once the reply is queued may later requests be answered directly
+        with self._lock:
+            self.pending -= 1
+
+    def _write(self):
+        while True:
+            line = self.outbox.get()
+            if line is None:
+                return
+            try:
+                self.sock.sendall(line.encode("utf-8"))
+            except OSError:
+                self.close()
+                return
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for token in list(self.subscriptions):
+            self.server.state_manager.unsubscribe(token)
+        self.subscriptions.clear()
+        try:
+            self.outbox.put_nowait(None)
+        except queue.Full:
+            pass  # the writer exits on its next failed send
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        connection = _Connection(self.server.rpc, self.connection)
+        try:
+            for raw in self.rfile:
+                if connection.closed:
+                    break
+                if raw.strip():
+                    self.server.rpc.handle_line(connection, raw)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+
+class RpcServer:
+    """
+    Serves the JSON-lines protocol above for one ``StateManager``.
+
+    Sockets are read and written on background threads. Reads are answered
+    there directly; writes, groups and sequences are queued and applied by
+    ``drain`` on the UI thread, every queued write in one state batch. With
+    ``direct=True`` (headless use) they are applied on the socket threads.
+
+    ``get_preset()`` returns the compiled preset whose groups and sequences
+    can be run. ``run_control(control)`` runs one of them and returns an
+    outcome string; by default groups are applied and sequences started on
+    a thread of their own.
+    """
+
+    MARSHALLED = frozenset(("set", "write_port", "batch", "group", "sequence", "subscribe", "unsubscribe"))
+
+    def __init__(self, state_manager, address, get_preset=None, run_control=None,
+                 direct=False, log_callback=None):
+        self.state_manager = state_manager
+        self.address = address
+        self.get_preset = get_preset
+        self.direct = direct
+        self.log_callback = log_callback
+        self.engine = SequenceEngine(state_manager, log_callback=log_callback)
+        self.run_control = run_control if run_control is not None else self._run_control
+        self.requests = queue.Queue()
+        self._server = None
+        self._thread = None
+
+    def _log(self, message):
+        if self.log_callback is not None:
+            self.log_callback(message)
+
+    def start(self):
+        if self._server is not None:
+            return
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            if _UnixServer is None:
+                raise ValueError("Unix domain sockets are not available on this platform")
+            if _is_socket(target):
+                os.unlink(target)  # left behind by a previous run
+            elif os.path.exists(target):
+                raise ValueError(f"{target} exists and is not a socket")
+            server = _UnixServer(target, _Handler)
+        else:
+            server = _TCPServer(target, _Handler)
+        server.rpc = self
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever, name="rpc-server", daemon=True)
+        self._thread.start()
+        self._log(f"RPC server listening on {self.bound_address()}")
+
+    def bound_address(self):
+        if self._server is None:
+            return None
+        address = self._server.server_address
+        if isinstance(address, tuple):
+            return f"tcp://{address[0]}:{address[1]}"
+        return f"unix:{address}"
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        kind, target = parse_address(self.address)
+        if kind == "unix" and _is_socket(target):
+            os.unlink(target)
+        self._server = None
+        self._thread = None
+
+    def handle_line(self, connection, raw):
+        REQUESTS.inc()
+        request_id = None
+        try:
+            request = json.loads(raw)
+            if not isinstance(request, dict):
+                raise RpcError("request must be a JSON object")
+            request_id = request.get("id")
+            method = request.get("method")
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise RpcError("'params' must be an object")
+            handler = getattr(self, f"_rpc_{method}", None) if isinstance(method, str) else None
+            if handler is None:
+                raise RpcError(f"unknown method {method!r}")
+            marshal = method in self.MARSHALLED or connection.pending > 0  # keep replies in request order
+            call = handler(connection, params)
+        except (TypeError, ValueError, RpcError) as exc:
+            message = str(exc)
+
+            def call():
+                raise RpcError(message)
+
+            marshal = connection.pending > 0  # the error still waits its turn
+        with connection._lock:
+            connection.pending += 1
+        if marshal and not self.direct:
+            self.requests.put((call, connection, request_id))
+        else:
+            self._run(call, connection, request_id)
+
+    def _run(self, call, connection, request_id):
+        try:
+            result = call()
+        except RpcError as exc:
+            connection.reply(request_id, error=str(exc))
+        except Exception as exc:
+            connection.reply(request_id, error=f"{type(exc).__name__}: {exc}")
+        else:
+            connection.reply(request_id, result)
+
+    def drain(self):
+        """Apply every queued request in one state batch; call from the UI thread."""
+        count = 0
+        with self.state_manager.batch():
+            while True:
+                try:
+                    call, connection, request_id = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                self._run(call, connection, request_id)
+                count += 1
+        if count:
+            DRAIN_SIZE.observe(count)
+        return count
+
+    # Handlers validate on the socket thread and return the work to run.
+
+    def _rpc_ping(self, connection, params):
+        return lambda: "pong"
+
+    def _rpc_get(self, connection, params):
+        state_manager = self.state_manager
+        if "pins" in params:
+            lines = [_line(*pair) for pair in params["pins"]]
+            return lambda: [state_manager.get_pin_state(device, pin) for device, pin in lines]
+        if "port" in params:
+            device, port = _port(params.get("device"), params["port"])
+            return lambda: state_manager.read_port(device, port)
+        device, pin = _line(params.get("device"), params.get("pin"))
+        return lambda: state_manager.get_pin_state(device, pin)
+
+    def _rpc_set(self, connection, params):
+        device, pin = _line(params.get("device"), params.get("pin"))
+        value = bool(params.get("value"))
+        return lambda: self.state_manager.set_pin_state(device, pin, value)
+
+    def _rpc_write_port(self, connection, params):
+        device, port = _port(params.get("device"), params.get("port"))
+        value = _byte(params, "value")
+        mask = _byte(params, "mask", 0xFF)
+        return lambda: [list(change) for change in self.state_manager.write_port(device, port, value, mask)]
+
+    def _rpc_batch(self, connection, params):
+        changes = params.get("changes")
+        if not isinstance(changes, list):
+            raise RpcError("'changes' must be a list of [device, pin, value]")
+        triples = []
+        for change in changes:
+            if not isinstance(change, list) or len(change) != 3:
+                raise RpcError(f"invalid change {change!r}")
+            triples.append(_line(change[0], change[1]) + (bool(change[2]),))
+        return lambda: self.state_manager.set_many(triples)
+
+    def _preset(self):
+        preset = self.get_preset() if self.get_preset is not None else None
+        if preset is None:
+            raise RpcError("no preset is loaded")
+        return preset
+
+    def _rpc_controls(self, connection, params):
+        preset = self._preset()
+        return lambda: [
+            {"id": control.id, "type": control.type, "label": control.label}
+            for control in preset.of_type("group", "sequence")
+        ]
+
+    def _control(self, params, control_type):
+        key = params.get("id")
+        for control in self._preset().of_type(control_type):
+            if key in (control.id, control.label):
+                return control
+        raise RpcError(f"unknown {control_type} {key!r}")
+
+    def _rpc_group(self, connection, params):
+        control = self._control(params, "group")
+        return lambda: self.run_control(control)
+
+    def _rpc_sequence(self, connection, params):
+        control = self._control(params, "sequence")
+        return lambda: self.run_control(control)
+
+    def _run_control(self, control):
+        if control.available is False:
+            return "unavailable"
+        if control.type == "group":
+            self.engine.apply_group(control)
+            return "applied"
+        if self.engine.pin_locks.conflicts(None, control.plan.write_pins):
+            return "busy"
+        threading.Thread(
+            target=self.engine.run_sequence, args=(control.plan,), name=f"sequence-{control.label}", daemon=True
+        ).start()
+        return "started"
+
+    def _rpc_subscribe(self, connection, params):
+        if "devices" in params:
+            devices = params["devices"]
+            if not isinstance(devices, list):
+                raise RpcError("'devices' must be a list")
+            pins = [
+                _line(device, pin_name(port, bit))
+                for device in devices for port in range(PORTS_PER_DEVICE) for bit in range(LINES_PER_PORT)
+            ]
+        else:
+            pins = [_line(*pair) for pair in params.get("pins") or []]
+        if not pins:
+            raise RpcError("nothing to subscribe to: pass 'pins' or 'devices'")
+
+        def subscribe():
+            token = None
+
+            def forward(changes):
+                # Runs on whichever thread committed the change: only queue the line.
+                connection.send({
+                    "event": "changes",
+                    "subscription": token,
+                    "changes": [[device, pin, value] for device, pin, value in changes],
+                })
+
+            token = self.state_manager.subscribe(pins, forward)
+            if connection.closed:
+                self.state_manager.unsubscribe(token)
+                raise RpcError("connection closed")
+            connection.subscriptions.add(token)
+            return token
+
+        return subscribe
+
+    def _rpc_unsubscribe(self, connection, params):
+        token = params.get("subscription")
+
+        def unsubscribe():
+            if token not in connection.subscriptions:
+                raise RpcError(f"unknown subscription {token!r}")
+            connection.subscriptions.discard(token)
+            self.state_manager.unsubscribe(token)
+
+        return unsubscribe
@@ -0,0 +1,173 @@
+from types import MappingProxyType
+
+from .metrics import registry
+from .port_state import PORTS_PER_DEVICE, pack_pins, parse_pin
+
+STEP_LAG = registry.histogram("sequence.step_lag_ms", "ms", resolution=0.01)
+
+
+class SequenceError(ValueError):
+    """Raised when a sequence's steps cannot be compiled."""
+
+    def __init__(self, where, message):
+        super().__init__(f"{where}: {message}")
+        self.where = where
+        self.message = message
+
+
+class _Frozen:
+    """Slotted record whose fields are set once in ``__init__``."""
+
+    __slots__ = ()
+
+    def _set(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+
+class PlanStep(_Frozen):
+    """One executable step of a compiled sequence."""
+
+    __slots__ = ("index", "action", "sets", "port_masks", "device", "pin", "state", "seconds", "timeout")
+
+    def __init__(self, index, action, sets=(), device="", pin="", state=False, seconds=0.0, timeout=0.0):
+        sets = tuple(sets)
+        packed, _leftovers = pack_pins(sets)
+        self._set(
+            index=index,  # index of the first source step
+            action=action,
+            sets=sets,
+            port_masks=MappingProxyType({key: tuple(entry) for key, entry in packed.items()}),
+            device=device,
+            pin=pin,
+            state=state,
+            seconds=seconds,
+            timeout=timeout,
+        )
+
+    def describe(self):
+        if self.action == "set":
+            return ", ".join(f"{dev} {pin} -> {state}" for dev, pin, state in self.sets)
+        if self.action == "wait":
+            return f"{self.seconds}s"
+        return f"{self.device} {self.pin} == {self.state}"
+
+
+class SequencePlan(_Frozen):
+    """Validated steps of a sequence, ready to run against absolute deadlines."""
+
+    __slots__ = ("label", "steps", "write_pins", "read_pins")
+
+    def __init__(self, label, steps):
+        steps = tuple(steps)
+        self._set(
+            label=label,
+            steps=steps,
+            write_pins=frozenset((dev, pin) for step in steps for dev, pin, _state in step.sets),
+            read_pins=frozenset((step.device, step.pin) for step in steps if step.action == "wait_for"),
+        )
+
+
+def _number(step, key, where, default=0):
+    value = step.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise SequenceError(f"{where}.{key}", f"must be a non-negative number, got {value!r}")
+    return float(value)
+
+
+def _line(step, where):
+    device = step.get("device", "")
+    pin = step.get("pin", "")
+    if not device:
+        raise SequenceError(f"{where}.device", "missing 'device'")
+    position = parse_pin(pin)
+    if position is None or position[0] >= PORTS_PER_DEVICE:
+        raise SequenceError(f"{where}.pin", f"invalid pin {pin!r}")
+    return device, pin
+
+
+def compile_sequence(label, steps, path=None):
+    """
+    Validate raw preset steps and build a ``SequencePlan``.
+
+    Runs of consecutive ``set`` steps become one plan step so they are
+    applied as a single transaction. Errors name the failing step as
+    ``path[i]`` when ``path`` is given, else as ``label step i``.
+    """
+    plan_steps = []
+    pending_sets = []
+    pending_index = None
+    for index, step in enumerate(steps or []):
+        where = f"{path}[{index}]" if path else f"{label} step {index}"
+        action = step.get("action", "")
+        if action == "set":
+            device, pin = _line(step, where)
+            if not pending_sets:
+                pending_index = index
+            pending_sets.append((device, pin, bool(step.get("state", False))))
+            continue
+        if pending_sets:
+            plan_steps.append(PlanStep(pending_index, "set", sets=pending_sets))
+            pending_sets = []
+        if action == "wait":
+            plan_steps.append(PlanStep(index, "wait", seconds=_number(step, "seconds", where)))
+        elif action == "wait_for":
+            device, pin = _line(step, where)
+            plan_steps.append(PlanStep(
+                index,
+                "wait_for",
+                device=device,
+                pin=pin,
+                state=bool(step.get("state", False)),
+                timeout=_number(step, "timeout_seconds", where),
+            ))
+        else:
+            raise SequenceError(f"{where}.action", f"unknown action {action!r}")
+    if pending_sets:
+        plan_steps.append(PlanStep(pending_index, "set", sets=pending_sets))
+    return SequencePlan(label, plan_steps)
+
+
+class SequenceReport:
+    """Scheduled versus actual start time of every step of one run."""
+
+    def __init__(self, label):
+        self.label = label
+        self.steps = []
+        self.outcome = None
+        self.duration = None
+
+    def record(self, step, scheduled, actual):
+        """Record a step start; times are seconds since the run started."""
+        entry = {
+            "index": step.index,
+            "action": step.action,
+            "scheduled_ms": round(scheduled * 1000.0, 3),
+            "actual_ms": round(actual * 1000.0, 3),
+            "lag_ms": round((actual - scheduled) * 1000.0, 3),
+        }
+        STEP_LAG.observe(max(0.0, entry["lag_ms"]))
+        self.steps.append(entry)
+        return entry
+
+    def finish(self, outcome, duration):
+        self.outcome = outcome
+        self.duration = duration
+
+    def max_lag_ms(self):
+        return max((entry["lag_ms"] for entry in self.steps), default=0.0)
+
+    def summary(self):
+        return f"{self.outcome} in {self.duration:.3f}s, max step lag {self.max_lag_ms():.1f} ms"
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "outcome": self.outcome,
+            "duration_s": self.duration,
+            "max_lag_ms": self.max_lag_ms(),
+            "steps": self.steps,
+        }
@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """
+    Wall time of named startup phases, plus a queue of deferred ones.
+
+    ``phase(name)`` times a block. ``defer(name, callback)`` queues work
+    that can wait until the window is on screen; the UI drains the queue
+    one phase per event-loop turn with ``run_next_deferred`` and can force
+    a single phase early with ``run_deferred(name)``.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []  # (name, seconds, deferred)
+        self.marks = {}
+        self._pending = []
+
+    @contextmanager
+    def phase(self, name, deferred=False):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start, deferred))
+
+    def mark(self, name):
+        """Record the time since startup began, e.g. when the first frame is drawn."""
+        self.marks[name] = time.perf_counter() - self.start
+
+    def defer(self, name, callback):
+        self._pending.append((name, callback))
+
+    def pending(self):
+        return [name for name, _callback in self._pending]
+
+    def run_next_deferred(self):
+        """Run the oldest deferred phase; returns False when none are left."""
+        if not self._pending:
+            return False
+        name, callback = self._pending.pop(0)
+        with self.phase(name, deferred=True):
+            callback()
+        return True
+
+    def run_deferred(self, name):
+        """Run the deferred phase ``name`` now if it has not run yet."""
+        for index, (pending_name, callback) in enumerate(self._pending):
+            if pending_name == name:
+                del self._pending[index]
+                with self.phase(name, deferred=True):
+                    callback()
+                return True
+        return False
+
+    def run_all_deferred(self):
+        while self.run_next_deferred():
+            pass
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def report(self):
+        width = max([len(name) for name, _seconds, _deferred in self.phases] + [len(name) for name in self.marks] + [5])
+        lines = ["Startup profile:"]
+        for name, seconds, deferred in self.phases:
+            suffix = "  (deferred)" if deferred else ""
+            lines.append(f"  {name:<{width}}  {seconds * 1000.0:9.1f} ms{suffix}")
+        for name, seconds in self.marks.items():
+            lines.append(f"  {name:<{width}}  {seconds * 1000.0:9.1f} ms since start")
+        lines.append(f"  {'total':<{width}}  {self.total() * 1000.0:9.1f} ms")
+        return "\n".join(lines)
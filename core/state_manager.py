@@ -0,0 +1,560 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from .metrics import registry
+from .port_state import DeviceState, iter_bits, parse_pin, pin_name
+from .watchdog import callback_name
+
+
+PERSISTENCE_MODES = ("immediate", "deferred")
+STORAGE_BACKENDS = ("snapshot", "journal")
+FSYNC_POLICIES = ("never", "close", "always")
+
+STATE_CHANGES = registry.counter("state.changes")
+COMMIT_TIME = registry.histogram("state.commit_us", "us")
+SAVE_TIME = registry.histogram("state.save_ms", "ms", resolution=0.01)
+FANOUT = registry.histogram("state.notify_fanout", "callbacks")
+HARDWARE_WRITE_TIME = registry.histogram("hardware.write_us", "us")
+HARDWARE_ERRORS = registry.counter("hardware.errors")
+
+
+def write_text_atomic(path, text, fsync=False):
+    """Write text to a temp file next to path and rename it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class StateWriter:
+    """
+    Background thread that coalesces save requests.
+
+    The first request after a write starts a ``interval`` second window;
+    every request arriving inside that window is folded into one write.
+    A failed write is retried after the next window; on ``close`` it is
+    tried once more and then dropped.
+    """
+
+    def __init__(self, write, interval=0.5):
+        self._write = write
+        self.interval = max(0.0, float(interval))
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._written = 0
+        self._failures = 0
+        self._flush_now = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self):
+        with self._cond:
+            self._requested += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Write pending changes now; return True once they are on disk, False if the write failed."""
+        with self._cond:
+            target = self._requested
+            if self._written >= target:
+                return True
+            failures = self._failures
+            self._flush_now = True
+            self._cond.notify_all()
+            self._cond.wait_for(
+                lambda: self._written >= target or self._failures > failures or not self._thread.is_alive(),
+                timeout,
+            )
+            return self._written >= target
+
+    def close(self, timeout=None):
+        """Write pending changes and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._requested > self._written or self._closed)
+                if self._requested <= self._written:
+                    return
+                deadline = time.monotonic() + self.interval
+                while not (self._flush_now or self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_now = False
+                target = self._requested
+            try:
+                self._write()
+                written = True
+            except Exception as exc:
+                print(f"State save failed: {exc}")
+                written = False
+            with self._cond:
+                if written:
+                    self._written = target
+                else:
+                    self._failures += 1
+                self._cond.notify_all()
+                if not written and self._closed:
+                    return
+
+
+class StateJournal:
+    """
+    Append-only log of pin transitions kept next to the snapshot file.
+
+    Every record is one compact JSON line ``[device, pin, value, t_ns]``
+    where ``t_ns`` is ``time.monotonic_ns()``. Compaction moves the live
+    journal aside, writes a fresh snapshot and then drops the moved
+    segment, so a crash at any point still replays to the latest state.
+    """
+
+    def __init__(self, path, fsync='never', keep_segments=0):
+        self.path = path
+        self.rotated_path = f"{path}.old"
+        self.fsync = fsync
+        self.keep_segments = int(keep_segments or 0)
+        self.records = 0
+        self._file = None
+
+    def replay(self, state):
+        """Apply the rotated and live journal records to ``state`` in place."""
+        self.records = 0
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        device, pin, value, _t_ns = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue  # torn tail of an interrupted append
+                    state.setdefault(device, {})[pin] = bool(value)
+                    if path == self.path:
+                        self.records += 1
+        return state
+
+    def _open(self):
+        if self._file is not None:
+            return
+        needs_newline = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        self._file = open(self.path, 'a')
+        if needs_newline:
+            self._file.write("\n")
+
+    def append(self, device, pin, value):
+        self._open()
+        record = json.dumps([device, pin, 1 if value else 0, time.monotonic_ns()], separators=(",", ":"))
+        self._file.write(record + "\n")
+        self._file.flush()
+        if self.fsync == 'always':
+            os.fsync(self._file.fileno())
+        self.records += 1
+
+    def rotate(self):
+        """Move the live journal aside; later appends start a new segment."""
+        self.close()
+        if os.path.exists(self.path):
+            if os.path.exists(self.rotated_path):
+                # A previous compaction did not finish; keep both segments.
+                with open(self.path, 'r') as src, open(self.rotated_path, 'a') as dst:
+                    dst.write(src.read())
+                os.unlink(self.path)
+            else:
+                os.replace(self.path, self.rotated_path)
+        self.records = 0
+
+    def discard_rotated(self):
+        """Drop (or archive) the rotated segment once a snapshot covers it."""
+        if not os.path.exists(self.rotated_path):
+            return
+        if self.keep_segments <= 0:
+            os.unlink(self.rotated_path)
+            return
+        for index in range(self.keep_segments - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.rotated_path, f"{self.path}.1")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StateManager:
+    """
+    Manages persistent state of device pins.
+
+    ``persistence="immediate"`` writes the state file on every change.
+    ``persistence="deferred"`` marks the state dirty and lets a background
+    writer flush it every ``flush_interval`` seconds and on ``close()``.
+    Files are always replaced atomically. ``fsync`` selects durability:
+    "never" leaves it to the OS, "close" syncs the final write on shutdown
+    and "always" syncs every write.
+
+    Pin values live in one ``DeviceState`` per device (a byte per port);
+    ``state`` is a dict view rebuilt on demand in the ``state.json`` format.
+
+    With a ``hardware`` backend every committed change is written through
+    as one call per touched port, skipping ports declared as inputs with
+    ``input_ports`` or ``set_input_ports``. The restored state is driven
+    onto the hardware once at startup, see ``sync_to_hardware``.
+
+    ``storage="journal"`` appends each pin change to ``<state_file>.journal``
+    instead of rewriting the snapshot; the snapshot is compacted in the
+    background once ``compact_every`` records have accumulated.
+    """
+    def __init__(self, state_file='state.json', persistence='immediate',
+                 flush_interval=0.5, fsync='never', storage='snapshot',
+                 compact_every=1000, keep_segments=0, hardware=None, input_ports=()):
+        if persistence not in PERSISTENCE_MODES:
+            raise ValueError(f"Unknown persistence mode: {persistence}")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend: {storage}")
+        self.state_file = state_file
+        self.persistence = persistence
+        self.fsync = fsync
+        self.storage = storage
+        self.compact_every = max(1, int(compact_every))
+        self.hardware = hardware
+        self.input_ports = frozenset(input_ports)
+        self._hardware_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._journal = None
+        if storage == 'journal':
+            self._journal = StateJournal(f"{state_file}.journal", fsync=fsync, keep_segments=keep_segments)
+        self.devices = {}
+        self.settings = {}
+        self._set_from_dict(self.load_state())
+        self._update_callbacks = []
+        self._subscribers = {}
+        self._subscriptions = {}
+        self._tokens = itertools.count(1)
+        self._subscriber_lock = threading.Lock()
+        self._local = threading.local()
+        self.watchdog = None  # optional StallWatchdog timing callbacks and saves
+        self._closed = False
+        self._writer = None
+        if storage == 'journal':
+            self._writer = StateWriter(self._compact, interval=flush_interval)
+        elif persistence == 'deferred':
+            self._writer = StateWriter(
+                lambda: self._write_snapshot(fsync=self.fsync == 'always'),
+                interval=flush_interval,
+            )
+        if hardware is not None:
+            self.sync_to_hardware()
+
+    def load_state(self):
+        state = {}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        if self._journal is not None:
+            self._journal.replay(state)
+        return state
+
+    def _set_from_dict(self, state):
+        for key, value in state.items():
+            if isinstance(value, dict):
+                self.devices[key] = DeviceState.from_dict(value)
+            else:
+                self.settings[key] = value
+
+    @property
+    def state(self):
+        with self._lock:
+            state = {device: device_state.to_dict() for device, device_state in self.devices.items()}
+            state.update(self.settings)
+        return state
+
+    def save_state(self):
+        if self._writer is not None:
+            self._writer.mark_dirty()
+        else:
+            self._write_snapshot(fsync=self.fsync == 'always')
+
+    def _compact(self, fsync=None):
+        """Fold the journal into a new snapshot."""
+        if fsync is None:
+            fsync = self.fsync == 'always'
+        start = time.perf_counter()
+        with self._lock:
+            self._journal.rotate()
+            text = json.dumps(self.state, indent=2)
+        write_text_atomic(self.state_file, text, fsync=fsync)
+        self._journal.discard_rotated()
+        SAVE_TIME.observe((time.perf_counter() - start) * 1000.0)
+
+    def _write_snapshot(self, fsync=False):
+        start = time.perf_counter()
+        with self._lock:
+            text = json.dumps(self.state, indent=2)
+        write_text_atomic(self.state_file, text, fsync=fsync)
+        SAVE_TIME.observe((time.perf_counter() - start) * 1000.0)
+
+    def flush(self, timeout=None):
+        """Block until every pending change has been written."""
+        if self._writer is not None:
+            return self._writer.flush(timeout)
+        return True
+
+    def close(self):
+        """Flush pending writes, stop the background writer and sync the final write."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._journal is not None:
+            if self._journal.records or self.fsync == 'close':
+                self._compact(fsync=self.fsync != 'never')
+            self._journal.close()
+        elif self.fsync == 'close':
+            self._write_snapshot(fsync=True)
+        if self.hardware is not None:
+            self.hardware.close()
+
+    def get_pin_state(self, device, pin):
+        device_state = self.devices.get(device)
+        if device_state is None:
+            return False
+        return device_state.get(pin)
+
+    def read_port(self, device, port):
+        """Return all lines of ``port`` as an int (bit n = line n)."""
+        device_state = self.devices.get(device)
+        return device_state.read_port(port) if device_state is not None else 0
+
+    def _device(self, device):
+        device_state = self.devices.get(device)
+        if device_state is None:
+            device_state = self.devices[device] = DeviceState()
+        return device_state
+
+    def set_pin_state(self, device, pin, value, write_through=True):
+        value = bool(value)
+        with self._lock:
+            self._device(device).set(pin, value)
+            if self._journal is not None:
+                self._journal.append(device, pin, value)
+        position = parse_pin(pin)
+        ports = ((device, position[0]),) if write_through and position is not None else ()
+        self._stage([(device, pin, value)], ports)
+
+    def write_port(self, device, port, value, mask=0xFF, write_through=True, force=False):
+        """
+        Write the lines of ``port`` selected by ``mask`` in one step.
+
+        Only lines whose value actually changed are journaled and notified.
+        With ``force`` the port goes to the hardware even when no cached line
+        changed, to re-assert outputs that may have drifted.
+        """
+        with self._lock:
+            changed = self._device(device).write_port(port, value, mask)
+            changes = [(device, pin_name(port, bit), bool(value >> bit & 1)) for bit in iter_bits(changed)]
+            if self._journal is not None:
+                for change in changes:
+                    self._journal.append(*change)
+        if changes or (force and write_through):
+            self._stage(changes, ((device, port),) if write_through else ())
+        return changes
+
+    def set_many(self, changes, write_through=True):
+        """Apply ``(device, pin, value)`` triples as one transaction."""
+        with self.batch():
+            for device, pin, value in changes:
+                self.set_pin_state(device, pin, value, write_through)
+
+    @contextmanager
+    def batch(self):
+        """
+        Defer saving and notification until the outermost block exits.
+
+        Callbacks then run once with every change made inside the block and
+        each touched port is written to the hardware once.
+        Batches are per thread and may be nested.
+        """
+        outermost = getattr(self._local, 'pending', None) is None
+        if outermost:
+            self._local.pending = {}
+            self._local.ports = set()
+        try:
+            yield self
+        finally:
+            if outermost:
+                pending = self._local.pending
+                ports = self._local.ports
+                self._local.pending = None
+                self._local.ports = None
+                if pending or ports:
+                    self._commit([(device, pin, value) for (device, pin), value in pending.items()], ports)
+
+    def _stage(self, changes, ports):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            self._commit(changes, ports)
+            return
+        for device, pin, value in changes:
+            pending[(device, pin)] = value
+        self._local.ports.update(ports)
+
+    def _commit(self, changes, ports=()):
+        start = time.perf_counter()
+        STATE_CHANGES.inc(len(changes))
+        if self.hardware is not None and ports:
+            self._write_hardware(ports)
+        if not changes:
+            return  # a forced write that only re-asserted the hardware
+        if self._journal is None:
+            with self._watch("StateManager.save_state"):
+                self.save_state()
+        elif self._journal.records >= self.compact_every:
+            self._writer.mark_dirty()
+        self._notify_update(changes)
+        COMMIT_TIME.observe((time.perf_counter() - start) * 1e6)
+
+    def set_input_ports(self, ports):
+        """Declare ``(device, port)`` pairs that are wired as inputs and never written."""
+        self.input_ports = frozenset(ports)
+
+    def _write_hardware(self, ports):
+        # Read and write under one lock so concurrent commits never push a stale port value.
+        with self._hardware_lock:
+            for device, port in sorted(ports):
+                if (device, port) in self.input_ports:
+                    continue
+                start = time.perf_counter()
+                try:
+                    self.hardware.write_port(device, port, self.read_port(device, port))
+                except Exception as exc:
+                    HARDWARE_ERRORS.inc()
+                    print(f"Hardware write failed for {device}/port{port}: {exc}")
+                HARDWARE_WRITE_TIME.observe((time.perf_counter() - start) * 1e6)
+
+    def sync_to_hardware(self):
+        """
+        Drive the restored output ports onto the hardware.
+
+        Output ports are read back and only those that differ from the
+        cached state are written; input ports are left alone. Returns the
+        ``(device, port)`` pairs written.
+        """
+        ports = []
+        with self._lock:
+            for device, restored in self.devices.items():
+                actual = DeviceState(len(restored.ports))
+                for port in range(len(restored.ports)):
+                    if (device, port) in self.input_ports:
+                        actual.write_port(port, restored.read_port(port))
+                        continue
+                    try:
+                        actual.write_port(port, self.hardware.read_port(device, port))
+                    except Exception as exc:
+                        HARDWARE_ERRORS.inc()
+                        print(f"Hardware read failed for {device}/port{port}: {exc}")
+                ports.extend((device, port) for port, _changed in restored.diff(actual))
+        if ports:
+            self._write_hardware(ports)
+        return ports
+
+    def register_update_callback(self, callback):
+        """Register ``callback(changes)``; ``changes`` is a list of ``(device, pin, value)``."""
+        if callback not in self._update_callbacks:
+            self._update_callbacks.append(callback)
+
+    def subscribe(self, pins, callback):
+        """
+        Call ``callback(changes)`` whenever one of ``pins`` changes.
+
+        ``pins`` is an iterable of ``(device, pin)`` pairs; ``changes`` only
+        holds the changes for those pins. Returns a token for ``unsubscribe``.
+        """
+        keys = tuple(dict.fromkeys(pins))
+        with self._subscriber_lock:
+            token = next(self._tokens)
+            self._subscriptions[token] = (keys, callback)
+            for key in keys:
+                self._subscribers.setdefault(key, {})[token] = callback
+        return token
+
+    def unsubscribe(self, token):
+        with self._subscriber_lock:
+            keys, _callback = self._subscriptions.pop(token, ((), None))
+            for key in keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.pop(token, None)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def _watch(self, name):
+        return nullcontext() if self.watchdog is None else self.watchdog.watch(name)
+
+    def _call(self, callback, changes):
+        if self.watchdog is None:
+            callback(changes)
+        else:
+            with self.watchdog.watch(callback_name(callback)):
+                callback(changes)
+
+    def _notify_update(self, changes):
+        for callback in list(self._update_callbacks):
+            self._call(callback, changes)
+        targets = {}
+        with self._subscriber_lock:
+            for change in changes:
+                for token, callback in self._subscribers.get((change[0], change[1]), {}).items():
+                    if token not in targets:
+                        targets[token] = (callback, [])
+                    targets[token][1].append(change)
+        FANOUT.observe(len(self._update_callbacks) + len(targets))
+        for token, (callback, token_changes) in targets.items():
+            if token in self._subscriptions:
+                self._call(callback, token_changes)
+
+    def get_current_preset(self):
+        return self.settings.get('current_preset', 'default.json')
+
+    def set_current_preset(self, preset):
+        with self._lock:
+            self.settings['current_preset'] = preset
+        self.save_state()
@@ -0,0 +1,156 @@
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+from .metrics import registry
+
+STALLS = registry.counter("watchdog.stalls")
+LATENESS = registry.histogram("watchdog.lateness_ms", "ms")
+STACK_DEPTH = 25
+MAX_REPORTS = 100
+
+
+def callback_name(callback):
+    """Readable name for a function, bound method or ``functools.partial``."""
+    callback = getattr(callback, "func", callback)
+    name = getattr(callback, "__qualname__", None) or repr(callback)
+    module = getattr(callback, "__module__", None)
+    return f"{module}.{name}" if module else name
+
+
+class StallWatchdog:
+    """
+    Detects stalls of the UI thread and attributes them to a callback.
+
+    The UI thread calls ``beat()`` every ``interval`` seconds from its event
+    loop; a beat that arrives more than ``threshold`` seconds late is a
+    stall. Callbacks run inside ``watch(name)`` (or wrapped with ``wrap``)
+    are remembered while they run, and a background thread samples the UI
+    thread's stack once a stall is under way. Reports are passed to
+    ``report_callback(report)`` and appended to ``path`` as JSON lines, both
+    from the UI thread once the stall is over; the newest ``max_reports``
+    stay in ``reports``.
+    """
+
+    def __init__(self, threshold=0.25, interval=0.05, report_callback=None, path=None, max_reports=MAX_REPORTS):
+        self.threshold = float(threshold)
+        self.interval = float(interval)
+        self.report_callback = report_callback
+        self.path = path
+        self.reports = deque(maxlen=max_reports)
+        self._ui_thread = threading.get_ident()
+        self._due = None
+        self._active = []  # names of watched callbacks running on the UI thread, outermost first
+        self._slowest = None  # (seconds, name) of the slowest watched callback since the last beat
+        self._sample = None  # (callbacks, stack) taken by the watchdog thread during a stall
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling; call from the UI thread, which is the one watched."""
+        if self._thread is not None:
+            return
+        self._ui_thread = threading.get_ident()
+        self._due = time.monotonic() + self.interval
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @contextmanager
+    def watch(self, name):
+        if threading.get_ident() != self._ui_thread:
+            yield  # only the UI thread can stall the UI
+            return
+        start = time.perf_counter()
+        self._active.append(name)
+        try:
+            yield
+        finally:
+            self._active.pop()
+            elapsed = time.perf_counter() - start
+            if self._slowest is None or elapsed > self._slowest[0]:
+                self._slowest = (elapsed, name)
+
+    def wrap(self, callback, name=None):
+        """Return ``callback`` wrapped in ``watch``, e.g. for a button command."""
+        name = name or callback_name(callback)
+
+        def watched(*args, **kwargs):
+            with self.watch(name):
+                return callback(*args, **kwargs)
+
+        return watched
+
+    def beat(self):
+        """Record a heartbeat of the UI loop; call every ``interval`` seconds."""
+        now = time.monotonic()
+        lateness = 0.0 if self._due is None else now - self._due
+        self._due = now + self.interval
+        LATENESS.observe(max(0.0, lateness) * 1000.0)
+        with self._lock:
+            sample, self._sample = self._sample, None
+        slowest, self._slowest = self._slowest, None
+        if lateness < self.threshold:
+            return None
+        callbacks, stack = sample if sample is not None else ([], [])
+        if callbacks:
+            culprit = callbacks[-1]
+        elif slowest is not None:
+            culprit = slowest[1]
+        else:
+            culprit = None
+        report = {
+            "time": time.time(),
+            "stall_ms": round(lateness * 1000.0, 1),
+            "callback": culprit,
+            "callbacks": callbacks,
+            "slowest": None if slowest is None else {"callback": slowest[1], "ms": round(slowest[0] * 1000.0, 1)},
+            "stack": stack,
+        }
+        STALLS.inc()
+        self.reports.append(report)
+        self._emit(report)
+        return report
+
+    def _emit(self, report):
+        if self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(report) + "\n")
+            except OSError as exc:
+                print(f"Failed to write stall report to {self.path}: {exc}")
+        if self.report_callback is not None:
+            self.report_callback(report)
+
+    def _run(self):
+        while not self._stop.wait(self.interval / 2):
+            due = self._due
+            if due is None or time.monotonic() - due < self.threshold:
+                continue
+            with self._lock:
+                if self._sample is not None:
+                    continue  # one sample per stall
+                frame = sys._current_frames().get(self._ui_thread)
+                stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame is not None else []
+                self._sample = (list(self._active), [line.rstrip() for line in stack])
+
+
+def format_report(report):
+    """One-line summary of a stall report for the event log."""
+    culprit = report["callback"] or "unknown callback"
+    return f"UI stalled for {report['stall_ms']:.0f} ms in {culprit}"
@@ -1,163 +1,309 @@
+import argparse
 import tkinter as tk
 from tkinter import ttk
-import json
 import os
 from tabs.utilities_tab import setup_settings_frame
 from tabs.device_tab import create_device_tab
 from tabs.control_panel_tab import create_control_panel_tab
+from tabs.refresh_scheduler import RefreshScheduler
+from core.state_manager import StateManager
+from core.hardware import create_backend
+from core.input_poller import InputPoller
+from core.event_log import EventLog
+from core.config_store import load_compiled_preset, load_config, selected_preset_path
+from core.presets import PresetError
+from core.rpc_server import RpcServer
+from core.startup import StartupProfile
+from core.watchdog import StallWatchdog, format_report
+from tabs.stall_watch import start_heartbeat
 
-class StateManager:
-    """
-    Manages persistent state of device pins.
-    """
-    def __init__(self, state_file='state.json'):
-        self.state_file = state_file
-        self.state = self.load_state()
-        self._update_callbacks = []
-
-    def load_state(self):
-        if os.path.exists(self.state_file):
-            with open(self.state_file, 'r') as f:
-                return json.load(f)
-        return {}
-
-    def save_state(self):
-        with open(self.state_file, 'w') as f:
-            json.dump(self.state, f, indent=2)
-
-    def get_pin_state(self, device, pin):
-        return self.state.get(device, {}).get(pin, False)
-
-    def set_pin_state(self, device, pin, value):
-        if device not in self.state:
-            self.state[device] = {}
-        self.state[device][pin] = value
-        self.save_state()
-        self._notify_update(device, pin, value)
-
-    def register_update_callback(self, callback):
-        if callback not in self._update_callbacks:
-            self._update_callbacks.append(callback)
-
-    def _notify_update(self, device, pin, value):
-        for callback in list(self._update_callbacks):
-            callback(device, pin, value)
-
-    def get_current_preset(self):
-        return self.state.get('current_preset', 'default.json')
-
-    def set_current_preset(self, preset):
-        self.state['current_preset'] = preset
-        self.save_state()
-
-root = tk.Tk()
-root.title("Control Panel")
-root.minsize(240, 400)
-
-def get_selected_preset_path(config_path="config.json"):
-    if os.path.exists(config_path):
-        with open(config_path, "r") as f:
-            config = json.load(f) or {}
-        preset_name = config.get("selected_preset", "default.json")
-        return os.path.join("presets", preset_name)
-    return os.path.join("presets", "default.json")
-
-def compute_initial_geometry(preset_path):
+INPUT_PUMP_MS = 15
+RPC_PUMP_MS = 5
+
+
+def compute_initial_geometry(root, preset_path, devices=None):
     width = 600
     height = 400
-    if not os.path.exists(preset_path):
-        return width, height
     try:
-        with open(preset_path, "r") as f:
-            preset = json.load(f) or {}
-    except json.JSONDecodeError:
+        preset = load_compiled_preset(preset_path, devices)
+    except PresetError:
         return width, height
 
-    window_cfg = preset.get("window", {})
-    preset_width = window_cfg.get("width")
-    preset_height = window_cfg.get("height")
-    if isinstance(preset_width, int) and isinstance(preset_height, int):
+    if preset.window is not None:
+        preset_width, preset_height = preset.window
         return max(width, preset_width), max(height, preset_height)
 
-    controls = preset.get("layout", {}).get("controls", [])
-    io_controls = [c for c in controls if c.get("type", "").lower() in {"output", "input", "break"}]
-    power_controls = [c for c in controls if c.get("type", "").lower() == "power"]
-
-    io_count = len(io_controls)
-    power_count = len(power_controls)
+    io_count = len(preset.of_type("output", "input", "break"))
+    power_count = len(preset.of_type("power"))
 
     width = max(width, 520 + (140 * power_count))
-    height = max(height, 260 + (28 * io_count))
+    # The I/O list scrolls, so long presets stop growing the window at the screen edge.
+    height = min(max(height, 260 + (28 * io_count)), max(height, root.winfo_screenheight() - 80))
     return width, height
 
-initial_preset_path = get_selected_preset_path()
-initial_width, initial_height = compute_initial_geometry(initial_preset_path)
-root.geometry(f"{initial_width}x{initial_height}")
-
-state_manager = StateManager()
-
-notebook = ttk.Notebook(root)
-notebook.pack(fill="both", expand=True, padx=10, pady=10)
-
-control_panel = create_control_panel_tab(notebook, state_manager)
-
-def refresh_all_tabs(device, pin, value):
-    for tab_id in notebook.tabs():
-        tab_widget = notebook.nametowidget(tab_id)
-        if hasattr(tab_widget, "refresh_from_state"):
-            tab_widget.refresh_from_state()
-        if hasattr(tab_widget, "refresh_output_controls"):
-            tab_widget.refresh_output_controls()
-        if hasattr(tab_widget, "refresh_input_controls"):
-            tab_widget.refresh_input_controls()
-        if hasattr(tab_widget, "refresh_power_controls"):
-            tab_widget.refresh_power_controls()
-        if hasattr(tab_widget, "refresh_group_controls"):
-            tab_widget.refresh_group_controls()
-        if hasattr(tab_widget, "log_event"):
-            tab_widget.log_event(f"State changed: {device} {pin} -> {value}")
-
-state_manager.register_update_callback(refresh_all_tabs)
-
-# Load config and add device tabs
-config_file = 'config.json'
-if os.path.exists(config_file):
-    with open(config_file, 'r') as f:
-        config = json.load(f)
-    devices = config.get('devices', [])
-    for dev in devices:
-        create_device_tab(notebook, dev, state_manager)
-
-settings_frame = ttk.Frame(root)
-setup_settings_frame(settings_frame, root, notebook, state_manager, control_panel)
-
-# Bottom frame for settings button
-bottom_frame = ttk.Frame(root)
-bottom_frame.pack(side=tk.BOTTOM, fill=tk.X)
-
-btn_text = tk.StringVar(value="⚙ Settings")
-root.btn_text = btn_text
-settings_btn = ttk.Button(bottom_frame, textvariable=btn_text, command=lambda: toggle_view())
-settings_btn.pack(side=tk.RIGHT, padx=10, pady=5)
-
-size_var = tk.StringVar(value="")
-size_label = ttk.Label(bottom_frame, textvariable=size_var, anchor="w", foreground="#6e6e6e")
-
-def update_size_label(_event=None):
-    size_var.set(f"Window: {root.winfo_width()} x {root.winfo_height()}")
-
-update_size_label()
-root.bind("<Configure>", update_size_label)
-size_label.pack(side=tk.LEFT, padx=10, pady=5)
-
-def toggle_view():
-    if notebook.winfo_ismapped():
-        notebook.pack_forget()
-        settings_frame.pack(fill="both", expand=True)
-        btn_text.set("Back")
-    else:
-        settings_frame.pack_forget()
-        notebook.pack(fill="both", expand=True, padx=10, pady=10)
-        btn_text.set("⚙ Settings")
-
-root.mainloop()
\ No newline at end of file
+
+def load_persistence_settings(config):
+    return {
+        "persistence": config.get("state_persistence", "deferred"),
+        "flush_interval": float(config.get("state_flush_interval", 0.5)),
+        "fsync": config.get("state_fsync", "close"),
+        "storage": config.get("state_storage", "snapshot"),
+        "compact_every": int(config.get("state_compact_every", 1000)),
+        "keep_segments": int(config.get("state_journal_segments", 0)),
+        "hardware": create_backend(config.get("hardware")),
+    }
+
+
+def load_ui_settings(config):
+    return {"max_fps": int(config.get("ui_max_fps", 60))}
+
+
+def load_event_log_settings(config):
+    return {
+        "capacity": int(config.get("event_log_memory", 200000)),
+        "path": config.get("event_log_file", os.path.join("logs", "events.jsonl")) or None,
+        "max_bytes": int(config.get("event_log_max_bytes", 10 * 1024 * 1024)),
+        "backups": int(config.get("event_log_backups", 5)),
+    }
+
+
+def load_poller_settings(config):
+    return {
+        "rate_hz": float(config.get("input_poll_hz", 50)),
+        "rates": config.get("input_poll_rates", {}),
+    }
+
+
+def load_watchdog_settings(config):
+    return {
+        "enabled": bool(config.get("stall_watchdog", False)),
+        "threshold": float(config.get("stall_threshold_ms", 250)) / 1000.0,
+        "path": config.get("stall_log_file", os.path.join("logs", "stalls.jsonl")) or None,
+    }
+
+
+def create_app(config=None, profile=None, defer=True, on_ready=None, watchdog=None, rpc_address=None):
+    """
+    Build the control panel window and return its root.
+
+    Each startup step runs as a named phase of ``profile``. With ``defer``
+    the settings frame and input polling are set up one per event-loop turn
+    after the first frame is drawn; ``on_ready`` is called once they have
+    all run. ``watchdog`` turns stall detection on or off, overriding the
+    ``stall_watchdog`` config key, and ``rpc_address`` starts the scripting
+    server there instead of at the ``rpc_server`` config key. Start the app with ``root.mainloop()``
+    and call ``shutdown(root)`` afterwards.
+    """
+    if profile is None:
+        profile = StartupProfile()
+
+    with profile.phase("tk init"):
+        root = tk.Tk()
+        root.title("Control Panel")
+        root.minsize(240, 400)
+        root.startup_profile = profile
+
+    with profile.phase("config"):
+        app_config = load_config() if config is None else config
+
+    with profile.phase("preset parse"):
+        initial_preset_path = selected_preset_path(app_config)
+        initial_width, initial_height = compute_initial_geometry(
+            root, initial_preset_path, app_config.get("devices", [])
+        )
+        root.geometry(f"{initial_width}x{initial_height}")
+
+    with profile.phase("state load"):
+        state_manager = StateManager(**load_persistence_settings(app_config))
+        root.state_manager = state_manager
+        root.refresh_scheduler = RefreshScheduler(root, **load_ui_settings(app_config))
+
+    notebook = ttk.Notebook(root)
+    notebook.pack(fill="both", expand=True, padx=10, pady=10)
+    root.notebook = notebook
+
+    with profile.phase("event log"):
+        event_log = EventLog(**load_event_log_settings(app_config))
+        root.event_log = event_log
+
+    watchdog_settings = load_watchdog_settings(app_config)
+    if watchdog_settings["enabled"] if watchdog is None else watchdog:
+
+        def report_stall(report):
+            message = format_report(report)
+            details = {"callback": report["callback"], "stall_ms": report["stall_ms"]}
+            if hasattr(root, "control_panel"):
+                root.control_panel.log_event(message, "stall", **details)
+            else:
+                event_log.record("stall", message, **details)
+
+        stall_watchdog = StallWatchdog(
+            threshold=watchdog_settings["threshold"], report_callback=report_stall, path=watchdog_settings["path"]
+        )
+        state_manager.watchdog = stall_watchdog
+        start_heartbeat(root, stall_watchdog)
+
+    with profile.phase("control build"):
+        control_panel = create_control_panel_tab(notebook, state_manager, event_log, app_config)
+        root.control_panel = control_panel
+
+        def log_state_changes(changes):
+            # Widgets refresh through per-pin subscriptions; only the log sees every change.
+            if hasattr(control_panel, "log_event"):
+                for device, pin, value in changes:
+                    control_panel.log_event(f"State changed: {device} {pin} -> {value}", "pin_change", device, pin)
+
+        state_manager.register_update_callback(log_state_changes)
+
+    with profile.phase("device tab build"):
+        # Add device tabs from config; their widgets are built on first selection
+        for dev in app_config.get('devices', []):
+            create_device_tab(notebook, dev, state_manager, control_panel.pin_locks)
+
+    settings_frame = ttk.Frame(root)
+
+    def build_settings():
+        setup_settings_frame(settings_frame, root, notebook, state_manager, control_panel, app_config)
+
+    # Bottom frame for settings button
+    bottom_frame = ttk.Frame(root)
+    bottom_frame.pack(side=tk.BOTTOM, fill=tk.X)
+
+    btn_text = tk.StringVar(value="⚙ Settings")
+    root.btn_text = btn_text
+    settings_btn = ttk.Button(bottom_frame, textvariable=btn_text, command=lambda: toggle_view())
+    settings_btn.pack(side=tk.RIGHT, padx=10, pady=5)
+
+    size_var = tk.StringVar(value="")
+    size_label = ttk.Label(bottom_frame, textvariable=size_var, anchor="w", foreground="#6e6e6e")
+
+    def update_size_label(_event=None):
+        size_var.set(f"Window: {root.winfo_width()} x {root.winfo_height()}")
+
+    update_size_label()
+    root.bind("<Configure>", update_size_label)
+    size_label.pack(side=tk.LEFT, padx=10, pady=5)
+
+    def toggle_view():
+        if notebook.winfo_ismapped():
+            # Settings opened before the deferred build got to it
+            profile.run_deferred("settings build")
+            notebook.pack_forget()
+            settings_frame.pack(fill="both", expand=True)
+            btn_text.set("Back")
+        else:
+            settings_frame.pack_forget()
+            notebook.pack(fill="both", expand=True, padx=10, pady=10)
+            btn_text.set("⚙ Settings")
+
+    root.input_poller = None
+
+    def start_input_poller():
+        if state_manager.hardware is None:
+            return
+        input_poller = InputPoller(
+            state_manager, state_manager.hardware, log_callback=control_panel.log_event,
+            **load_poller_settings(app_config)
+        )
+        input_poller.start()
+        root.input_poller = input_poller
+
+        def pump_inputs():
+            input_poller.drain()
+            root.after(INPUT_PUMP_MS, pump_inputs)
+
+        root.after(INPUT_PUMP_MS, pump_inputs)
+
+    root.rpc_server = None
+
+    def start_rpc_server():
+        address = rpc_address or app_config.get("rpc_server")
+        if not address:
+            return
+        rpc_server = RpcServer(
+            state_manager,
+            address,
+            get_preset=lambda: control_panel.preset,
+            run_control=control_panel.run_control,
+            log_callback=control_panel.log_event,
+        )
+        try:
+            rpc_server.start()
+        except (OSError, ValueError) as exc:
+            control_panel.log_event(f"RPC server not started on {address}: {exc}")
+            return
+        root.rpc_server = rpc_server
+
+        def pump_requests():
+            rpc_server.drain()
+            root.after(RPC_PUMP_MS, pump_requests)
+
+        root.after(RPC_PUMP_MS, pump_requests)
+
+    profile.defer("settings build", build_settings)
+    profile.defer("input poller", start_input_poller)
+    profile.defer("rpc server", start_rpc_server)
+    if not defer:
+        profile.run_all_deferred()
+
+    def run_deferred():
+        if profile.run_next_deferred():
+            root.after(1, run_deferred)
+        elif on_ready is not None:
+            on_ready(root)
+
+    def first_paint():
+        root.update_idletasks()
+        profile.mark("first paint")
+        run_deferred()
+
+    root.after_idle(first_paint)
+    root.protocol("WM_DELETE_WINDOW", lambda: shutdown(root))
+    return root
+
+
+def shutdown(root):
+    """Stop polling, flush state and the event log, and close the window; safe to call twice."""
+    if getattr(root, "_shut_down", False):
+        return
+    root._shut_down = True
+    if getattr(root, "input_poller", None) is not None:
+        root.input_poller.stop()
+        root.input_poller = None
+    if getattr(root, "rpc_server", None) is not None:
+        root.rpc_server.stop()
+        root.rpc_server = None
+    if getattr(root, "stall_watchdog", None) is not None:
+        root.stall_watchdog.stop()
+        root.stall_watchdog = None
+    root.state_manager.close()
+    root.event_log.close()
+    try:
+        root.destroy()
+    except tk.TclError:
+        pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NI USB-6501 control panel.")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print the wall time of each startup phase once startup finishes")
+    parser.add_argument("--no-defer", action="store_true",
+                        help="build everything before the first frame instead of just after it")
+    parser.add_argument("--watchdog", action="store_true", default=None,
+                        help="report UI stalls and the callback behind them to the event log")
+    parser.add_argument("--rpc", metavar="ADDRESS",
+                        help="serve scripted pin control at ADDRESS, e.g. 127.0.0.1:8765 or unix:/tmp/panel.sock")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    on_ready = (lambda root: print(root.startup_profile.report())) if args.startup_profile else None
+    root = create_app(defer=not args.no_defer, on_ready=on_ready, watchdog=args.watchdog, rpc_address=args.rpc)
+    root.mainloop()
+    shutdown(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Run the benchmark suite and save the results as JSON.
+
+    python run_benchmarks.py                       # full suite
+    python run_benchmarks.py --quick --only state  # a subset
+    python run_benchmarks.py --compare benchmarks/results/baseline.json
+
+Tk benchmarks need a display; use ``xvfb-run -a`` on headless machines.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks import core_bench, ui_bench
+from benchmarks.harness import compare, environment, result_key
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark state, refresh and build hot paths.")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and repeats")
+    parser.add_argument("--only", action="append", default=[], help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--no-ui", action="store_true", help="skip the benchmarks that need Tk")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default 0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def print_results(results):
+    for entry in results:
+        if "skipped" in entry:
+            print(f"{result_key(entry):<60} skipped: {entry['skipped']}")
+            continue
+        per_op = entry["per_op_us"]
+        print(f"{result_key(entry):<60} {per_op['median']:>12.3f} us/op  (min {per_op['min']:.3f})")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = {"environment": environment(), "quick": args.quick, "results": []}
+    start = time.perf_counter()
+    output["results"].extend(core_bench.run(args.quick, args.only))
+    if not args.no_ui:
+        output["results"].extend(ui_bench.run(args.quick, args.only))
+    output["elapsed_s"] = round(time.perf_counter() - start, 3)
+    print_results(output["results"])
+
+    path = args.output or os.path.join(
+        "benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Saved {len(output['results'])} results to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(output, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} ({baseline.get('environment', {}).get('commit')}):")
+        for key, before, after, ratio in rows:
+            flag = "  REGRESSION" if (key, before, after, ratio) in regressions else ""
+            print(f"{key:<60} {before:>10.3f} -> {after:>10.3f} us/op  x{ratio:.2f}{flag}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Run preset groups and sequences without a display.
+
+    python run_headless.py --preset limit_test.json --sequence seq_01 --cycles 1000 --output results.json
+
+Groups and sequences are selected by id or label. Results are written as
+JSON; the exit status is 1 if any sequence did not complete.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from core.engine import SequenceEngine
+from core.event_log import EventLog
+from core.hardware import create_backend
+from core.input_poller import InputPoller
+from core.config_store import load_compiled_preset, load_config, preset_path
+from core.presets import PresetError
+from core.state_manager import StateManager
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run preset groups and sequences headless.")
+    parser.add_argument("--preset", help="preset file name (default: selected_preset from config.json)")
+    parser.add_argument("--group", action="append", default=[], help="group id or label to apply (repeatable)")
+    parser.add_argument("--sequence", action="append", default=[], help="sequence id or label to run (repeatable)")
+    parser.add_argument("--all", action="store_true", help="run every group and sequence in preset order")
+    parser.add_argument("--cycles", type=int, default=1, help="number of times to run the selection")
+    parser.add_argument("--parallel", action="store_true",
+                        help="run the selected sequences concurrently; sequences sharing a pin still take turns")
+    parser.add_argument("--state-file", default="headless_state.json",
+                        help="where pin state persists between runs (kept apart from the GUI's state.json)")
+    parser.add_argument("--hardware", choices=["none", "simulated", "nidaqmx"], help="override the configured backend")
+    parser.add_argument("--latency-ms", type=float, help="per-call latency of the simulated backend")
+    parser.add_argument("--output", help="write results to this file instead of stdout")
+    parser.add_argument("--summary-only", action="store_true", help="omit per-run results")
+    parser.add_argument("--verbose", action="store_true", help="print the event log")
+    parser.add_argument("--event-log", help="stream structured events to this JSONL file")
+    return parser.parse_args(argv)
+
+
+def select_controls(preset, group_keys, sequence_keys, run_all):
+    """Return the compiled controls in the order they should run."""
+    if run_all:
+        return preset.of_type("group", "sequence")
+    selected = []
+    for control_type, keys in (("group", group_keys), ("sequence", sequence_keys)):
+        candidates = preset.of_type(control_type)
+        for key in keys:
+            match = next((c for c in candidates if key in (c.id, c.label)), None)
+            if match is None:
+                raise SystemExit(f"Unknown {control_type}: {key}")
+            selected.append(match)
+    return selected
+
+
+def summarize(results, elapsed):
+    sequences = [r for r in results if r["type"] == "sequence"]
+    durations = [r["duration_s"] for r in sequences]
+    return {
+        "runs": len(results),
+        "sequences": len(sequences),
+        "completed": sum(1 for r in sequences if r["outcome"] == "completed"),
+        "timeouts": sum(1 for r in sequences if r["outcome"] == "timeout"),
+        "mean_sequence_s": sum(durations) / len(durations) if durations else 0.0,
+        "max_lag_ms": max((r["max_lag_ms"] for r in sequences), default=0.0),
+        "elapsed_s": elapsed,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_config()
+    preset_name = args.preset or config.get("selected_preset", "default.json")
+    path = preset_path(preset_name)
+    if not os.path.isfile(path):
+        raise SystemExit(f"preset not found: {path}")
+    try:
+        preset = load_compiled_preset(path, config.get("devices"))
+    except PresetError as exc:
+        raise SystemExit(f"Invalid preset {exc}")
+    for path, message in preset.warnings:
+        print(f"warning: {path}: {message}", file=sys.stderr)
+    selected = select_controls(preset, args.group, args.sequence, args.all)
+    if not selected:
+        raise SystemExit("Nothing to run: pass --group, --sequence or --all")
+
+    hardware_settings = dict(config.get("hardware") or {})
+    if args.hardware:
+        hardware_settings["backend"] = args.hardware
+    if args.latency_ms is not None:
+        hardware_settings["latency_ms"] = args.latency_ms
+    hardware = create_backend(hardware_settings)
+
+    state_manager = StateManager(
+        args.state_file, persistence="deferred", hardware=hardware, input_ports=preset.input_ports
+    )
+
+    event_log = EventLog(capacity=1000, path=args.event_log) if args.event_log else None
+
+    def log_event(message, event_type="info", device=None, pin=None, **data):
+        if event_log is not None:
+            event_log.record(event_type, message, device, pin, **data)
+        if args.verbose:
+            print(message)
+
+    poller = None
+    if hardware is not None:
+        poller = InputPoller(
+            state_manager,
+            hardware,
+            rate_hz=float(config.get("input_poll_hz", 50)),
+            rates=config.get("input_poll_rates", {}),
+            direct=True,
+            log_callback=log_event,
+        )
+        poller.start()
+
+    engine = SequenceEngine(state_manager, log_callback=log_event)
+    results = []
+    start = time.monotonic()
+    try:
+        for cycle in range(args.cycles):
+            cycle_results = []
+            for control in selected:
+                if control.type == "group":
+                    cycle_results.append(engine.apply_group(control))
+                elif not args.parallel:
+                    cycle_results.append(engine.run_sequence(control.plan).to_dict())
+            if args.parallel:
+                sequence_plans = [control.plan for control in selected if control.type == "sequence"]
+                cycle_results.extend(report.to_dict() for report in engine.run_parallel(sequence_plans))
+            for result in cycle_results:
+                result.setdefault("type", "sequence")
+                result["cycle"] = cycle
+            results.extend(cycle_results)
+    except KeyboardInterrupt:
+        engine.stop()
+    finally:
+        if poller is not None:
+            poller.stop()
+        state_manager.close()
+        if event_log is not None:
+            event_log.close()
+
+    output = {"preset": preset_name, "summary": summarize(results, time.monotonic() - start)}
+    if not args.summary_only:
+        output["results"] = results
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    failed = any(r["type"] == "sequence" and r["outcome"] != "completed" for r in results)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
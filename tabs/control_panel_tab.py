@@ -1,8 +1,22 @@
-import json
-import os
+import math
 import time
+from collections import deque
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog, ttk
+
+from core.config_store import load_compiled_preset, load_config, selected_preset_path
+from core.event_log import EVENT_TYPES, EventLog
+from core.metrics import registry
+from core.port_state import iter_bits, pin_name
+from core.pin_locks import PinLockManager
+from core.presets import DEFAULT_EVENT_LOG_CAPACITY, IO_TYPES, PresetError
+from core.sequence import SequenceReport
+from .refresh_scheduler import get_refresh_scheduler
+from .stall_watch import watched_command
+from .virtual_list import VirtualList
+
+LOG_INSERTS = registry.counter("log.inserts")
+LOG_FLUSH_TIME = registry.histogram("log.flush_us", "us")
 
 
 class HoverTooltip:
@@ -62,7 +76,68 @@ class HoverTooltip:
             self._tip_window = None
 
 
-class OutputControl(ttk.Frame):
+def subscribe_widget(widget, state_manager, pins, callback):
+    """
+    Subscribe ``callback`` to ``pins`` for as long as ``widget`` exists.
+
+    Returns a function that moves the subscription to other pins, for
+    widgets that get recycled; no pins drops it until the next move.
+    """
+    token = state_manager.subscribe(pins, callback)
+
+    def _on_destroy(event):
+        if event.widget is widget and token is not None:
+            state_manager.unsubscribe(token)
+
+    def resubscribe(new_pins):
+        nonlocal token
+        if token is not None:
+            state_manager.unsubscribe(token)
+        token = state_manager.subscribe(new_pins, callback) if new_pins else None
+
+    widget.bind("<Destroy>", _on_destroy, add="+")
+    return resubscribe
+
+
+class LockableControl:
+    """Button enable/disable shared by controls that sequences can lock."""
+
+    lock_pins = frozenset()
+    unavailable = False
+    _locked = False
+
+    def _is_disabled(self):
+        return self.unavailable or self._locked
+
+    def can_run(self):
+        """True if pressing the button now would do something."""
+        return not self._is_disabled()
+
+    def _update_button_state(self):
+        self.button.configure(state="disabled" if self._is_disabled() else "normal")
+
+    def set_locked(self, locked):
+        if locked != self._locked:
+            self._locked = locked
+            self._update_button_state()
+
+    def mark_unavailable(self):
+        """Disable the control for good, e.g. when its device is not configured."""
+        self.unavailable = True
+        self.button.configure(foreground="#b00020")
+        self._update_button_state()
+
+    def set_available(self, available):
+        """Like ``mark_unavailable``, but reversible for recycled rows."""
+        if not available:
+            self.mark_unavailable()
+        elif self.unavailable:
+            self.unavailable = False
+            self.button.configure(foreground=self.default_button_fg)
+            self._update_button_state()
+
+
+class OutputControl(LockableControl, ttk.Frame):
     """UI control for an output-type signal in the control panel."""
 
     def __init__(self, parent, state_manager, device, pin, label,
@@ -77,11 +152,12 @@ class OutputControl(ttk.Frame):
         self.secondary_label = secondary_label
         self.base_label = label
         self.write_callback = write_callback
+        self.lock_pins = frozenset([(device, pin)])
 
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
 
-        self.button = tk.Button(self, text=label, command=self.toggle)
+        self.button = tk.Button(self, text=label, command=watched_command(self, self.toggle))
         self.button.grid(row=0, column=0, sticky="nsew")
         self.default_button_bg = self.button.cget("background")
         self.default_button_fg = self.button.cget("foreground")
@@ -89,9 +165,10 @@ class OutputControl(ttk.Frame):
         device_label = self.device or "Unknown"
         pin_label = self.pin or "Unknown"
         tooltip_text = f"Device: {device_label}\nLine: {pin_label}"
-        HoverTooltip(self.button, tooltip_text)
+        self.tooltip = HoverTooltip(self.button, tooltip_text)
 
-        self.refresh()
+        self._resubscribe = subscribe_widget(self, state_manager, [(device, pin)], lambda _changes: self.refresh())
+        self.render()
 
     def _status_text(self, is_on):
         if self.secondary_label:
@@ -99,6 +176,10 @@ class OutputControl(ttk.Frame):
         return "ON" if is_on else "OFF"
 
     def refresh(self):
+        """Schedule a repaint on the next frame."""
+        get_refresh_scheduler(self).request(self.render)
+
+    def render(self):
         is_on = bool(self.state_manager.get_pin_state(self.device, self.pin))
         if self.secondary_label:
             self.button.configure(text=f"{self.base_label}: {self._status_text(is_on)}")
@@ -119,43 +200,71 @@ class OutputControl(ttk.Frame):
         self.state_manager.set_pin_state(self.device, self.pin, bool(value))
         if self.write_callback is not None:
             self.write_callback(self.device, self.pin, bool(value))
-        self.refresh()
+
+    def rebind(self, device, pin, **options):
+        """Point a recycled row at another line."""
+        self.device = device
+        self.pin = pin
+        self.lock_pins = frozenset([(device, pin)])
+        self.tooltip.text = f"Device: {device or 'Unknown'}\nLine: {pin or 'Unknown'}"
+        self._resubscribe([(device, pin)])
+        self.reconfigure(**options)
+
+    def release(self):
+        """Stop following the line while the row sits in the pool."""
+        self._resubscribe(())
 
     def toggle(self):
         current = bool(self.state_manager.get_pin_state(self.device, self.pin))
         self.set_state(not current)
 
+    def reconfigure(self, label, on_color=None, off_color=None, secondary_label=None):
+        """Apply new preset appearance without rebuilding the widget."""
+        self.base_label = label
+        self.on_color = on_color
+        self.off_color = off_color
+        self.secondary_label = secondary_label
+        self.button.configure(text=label)
+        self.render()
 
-class GroupControl(ttk.Frame):
+
+class GroupControl(LockableControl, ttk.Frame):
     """UI control for a group-type action button."""
 
-    def __init__(self, parent, state_manager, label, actions,
+    def __init__(self, parent, state_manager, label, port_masks,
                  on_color="#4CAF50", off_color="#cac9c8"):
         super().__init__(parent)
         self.state_manager = state_manager
         self.label = label
-        self.actions = actions
+        self.port_masks = port_masks
         self.on_color = on_color
         self.off_color = off_color
 
-        self.button = tk.Button(self, text=label, command=self.apply_group)
+        self.button = tk.Button(self, text=label, command=watched_command(self, self.apply_group))
         self.button.pack(fill="x", expand=True)
         self.default_button_bg = self.button.cget("background")
         self.default_button_fg = self.button.cget("foreground")
 
         self.log_callback = None
-        self.refresh()
+        self.lock_pins = frozenset(
+            (dev, pin_name(port, bit)) for (dev, port), (mask, _value) in port_masks.items() for bit in iter_bits(mask)
+        )
+        subscribe_widget(self, state_manager, self.lock_pins, lambda _changes: self.refresh())
+        self.render()
 
     def _is_active(self):
-        for action in self.actions:
-            dev = action.get("device", "")
-            pin = action.get("pin", "")
-            state = bool(action.get("state", False))
-            if self.state_manager.get_pin_state(dev, pin) != state:
+        if not self.port_masks:
+            return False
+        for (dev, port), (mask, value) in self.port_masks.items():
+            if self.state_manager.read_port(dev, port) & mask != value:
                 return False
-        return True if self.actions else False
+        return True
 
     def refresh(self):
+        """Schedule a repaint on the next frame."""
+        get_refresh_scheduler(self).request(self.render)
+
+    def render(self):
         is_active = self._is_active()
         if is_active:
             self.button.configure(
@@ -171,93 +280,181 @@ class GroupControl(ttk.Frame):
             )
 
     def apply_group(self):
-        for action in self.actions:
-            dev = action.get("device", "")
-            pin = action.get("pin", "")
-            state = bool(action.get("state", False))
-            self.state_manager.set_pin_state(dev, pin, state)
+        with self.state_manager.batch():
+            for (dev, port), (mask, value) in self.port_masks.items():
+                self.state_manager.write_port(dev, port, value, mask, force=True)
         if self.log_callback is not None:
-            self.log_callback(f"Group applied: {self.label}")
-        self.refresh()
+            self.log_callback(f"Group applied: {self.label}", event_type="group")
+
+    def run(self):
+        """Press the button; returns the outcome."""
+        self.apply_group()
+        return "applied"
+
+    def reconfigure(self, label, on_color="#4CAF50", off_color="#cac9c8"):
+        """Apply new preset appearance without rebuilding the widget."""
+        self.label = label
+        self.on_color = on_color
+        self.off_color = off_color
+        self.button.configure(text=label)
+        self.render()
 
 
-class SequenceControl(ttk.Frame):
+class SequenceControl(LockableControl, ttk.Frame):
     """UI control for a sequence-type action button."""
 
-    def __init__(self, parent, state_manager, label, steps, disable_callback, enable_callback, log_callback=None):
+    def __init__(self, parent, state_manager, label, plan, pin_locks, log_callback=None):
         super().__init__(parent)
         self.state_manager = state_manager
         self.label = label
-        self.steps = steps
-        self.disable_callback = disable_callback
-        self.enable_callback = enable_callback
+        self.plan = plan
+        self.lock_pins = plan.write_pins
+        self.pin_locks = pin_locks
         self.log_callback = log_callback
         self._running = False
+        self._wait_token = None
+        self._after_id = None
 
-        self.button = tk.Button(self, text=label, command=self.start)
+        self.button = tk.Button(self, text=label, command=watched_command(self, self.start))
         self.button.pack(fill="x", expand=True)
+        self.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _is_disabled(self):
+        return self.unavailable or self._locked or self._running
+
+    def reconfigure(self, label):
+        """Rename the sequence; a run in progress keeps going."""
+        self.label = label
+        self.button.configure(text=label)
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self._cancel_wait()
+            if self._running:
+                self.pin_locks.release(self)
+
+    def _log(self, message, event_type="sequence", **fields):
+        if self.log_callback is not None:
+            self.log_callback(message, event_type=event_type, **fields)
 
     def start(self):
+        """Start the sequence; returns False if it is running or its pins are taken."""
         if self._running:
-            return
+            return False
+        conflicts = self.pin_locks.try_acquire(self, self.plan.write_pins)
+        if conflicts:
+            busy = ", ".join(f"{dev} {pin}" for dev, pin in sorted(conflicts))
+            self._log(f"Sequence {self.label}: blocked, in use by another sequence: {busy}")
+            return False
         self._running = True
-        if self.log_callback is not None:
-            self.log_callback(f"Sequence started: {self.label}")
-        self.disable_callback()
-        self._run_step(0, time.monotonic())
-
-    def _run_step(self, index, start_time):
-        if index >= len(self.steps):
-            self._finish()
-            return
-        step = self.steps[index]
-        action = step.get("action", "")
-
-        if action == "set":
-            dev = step.get("device", "")
-            pin = step.get("pin", "")
-            state = bool(step.get("state", False))
-            self.state_manager.set_pin_state(dev, pin, state)
-            if self.log_callback is not None:
-                self.log_callback(f"Sequence {self.label}: set {dev} {pin} -> {state}")
-            self.after(10, lambda: self._run_step(index + 1, start_time))
-        elif action == "wait":
-            seconds = float(step.get("seconds", 0))
-            if self.log_callback is not None:
-                self.log_callback(f"Sequence {self.label}: wait {seconds}s")
-            self.after(int(seconds * 1000), lambda: self._run_step(index + 1, start_time))
-        elif action == "wait_for":
-            dev = step.get("device", "")
-            pin = step.get("pin", "")
-            desired = bool(step.get("state", False))
-            timeout = float(step.get("timeout_seconds", 0))
-            poll_ms = int(step.get("poll_ms", 200))
-            if self.state_manager.get_pin_state(dev, pin) == desired:
-                if self.log_callback is not None:
-                    self.log_callback(f"Sequence {self.label}: condition met {dev} {pin} == {desired}")
-                self.after(10, lambda: self._run_step(index + 1, start_time))
+        self._update_button_state()
+        self._log(f"Sequence started: {self.label}")
+        self._index = 0
+        self._t0 = time.monotonic()
+        self._deadline = self._t0
+        self._report = SequenceReport(self.label)
+        self._run_next()
+        return True
+
+    def run(self):
+        """Press the button; returns "started", or "busy" if its pins are taken."""
+        return "started" if self.start() else "busy"
+
+    def _run_next(self):
+        """Run every step that is due, then sleep until the next deadline."""
+        self._after_id = None
+        steps = self.plan.steps
+        while self._index < len(steps):
+            delay = self._deadline - time.monotonic()
+            if delay > 0:
+                self._after_id = self.after(math.ceil(delay * 1000), self._run_next)
                 return
-            if timeout > 0 and (time.monotonic() - start_time) >= timeout:
-                if self.log_callback is not None:
-                    self.log_callback(f"Sequence {self.label}: timeout waiting for {dev} {pin}")
-                self._finish()
+            step = steps[self._index]
+            self._index += 1
+            entry = self._report.record(step, self._deadline - self._t0, time.monotonic() - self._t0)
+            if step.action == "set":
+                with self.state_manager.batch():
+                    for (dev, port), (mask, value) in step.port_masks.items():
+                        self.state_manager.write_port(dev, port, value, mask)
+                for dev, pin, state in step.sets:
+                    self._log(f"Sequence {self.label}: set {dev} {pin} -> {state}", "sequence_step", device=dev, pin=pin)
+            elif step.action == "wait":
+                self._log(f"Sequence {self.label}: wait {step.seconds}s", "sequence_step")
+                self._deadline += step.seconds
+            elif step.action == "wait_for":
+                if self.state_manager.get_pin_state(step.device, step.pin) == step.state:
+                    entry["outcome"] = "met"
+                    self._log(
+                        f"Sequence {self.label}: condition met {step.device} {step.pin} == {step.state}",
+                        "sequence_step", device=step.device, pin=step.pin,
+                    )
+                    continue
+                self._log(
+                    f"Sequence {self.label}: waiting for {step.device} {step.pin} == {step.state}",
+                    "sequence_step", device=step.device, pin=step.pin,
+                )
+                self._wait_for(step, entry)
                 return
-            if self.log_callback is not None:
-                self.log_callback(f"Sequence {self.label}: waiting for {dev} {pin} == {desired}")
-            self.after(poll_ms, lambda: self._run_step(index, start_time))
-        else:
-            if self.log_callback is not None:
-                self.log_callback(f"Sequence {self.label}: unknown step")
-            self._finish()
+        delay = self._deadline - time.monotonic()
+        if delay > 0:
+            # A trailing wait keeps the run, and its pin locks, going until it is over
+            self._after_id = self.after(math.ceil(delay * 1000), self._run_next)
+            return
+        self._finish("completed")
+
+    def _wait_for(self, step, entry):
+        """Resume on the first matching change of the pin, or fail at the deadline."""
+        step_start = self._deadline
+
+        def on_change(changes):
+            if any(value == step.state for _dev, _pin, value in changes):
+                self._cancel_wait()
+                met_at = time.monotonic()
+                entry["outcome"] = "met"
+                entry["duration_ms"] = round((met_at - step_start) * 1000.0, 3)
+                self._log(
+                    f"Sequence {self.label}: condition met {step.device} {step.pin} == {step.state}",
+                    "sequence_step", device=step.device, pin=step.pin,
+                )
+                self._deadline = met_at
+                self._after_id = self.after_idle(self._run_next)
 
-    def _finish(self):
+        def on_timeout():
+            self._after_id = None
+            self._cancel_wait()
+            entry["outcome"] = "timeout"
+            entry["duration_ms"] = round((time.monotonic() - step_start) * 1000.0, 3)
+            self._log(
+                f"Sequence {self.label}: timeout waiting for {step.device} {step.pin}",
+                "timeout", device=step.device, pin=step.pin,
+            )
+            self._finish("timeout")
+
+        self._wait_token = self.state_manager.subscribe([(step.device, step.pin)], on_change)
+        if step.timeout > 0:
+            remaining = step_start + step.timeout - time.monotonic()
+            self._after_id = self.after(max(1, math.ceil(remaining * 1000)), on_timeout)
+
+    def _cancel_wait(self):
+        if self._wait_token is not None:
+            self.state_manager.unsubscribe(self._wait_token)
+            self._wait_token = None
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _finish(self, outcome):
         self._running = False
-        self.enable_callback()
-        if self.log_callback is not None:
-            self.log_callback(f"Sequence finished: {self.label}")
+        self._report.finish(outcome, time.monotonic() - self._t0)
+        self.pin_locks.release(self)
+        self._update_button_state()
+        self._log(
+            f"Sequence finished: {self.label} ({self._report.summary()})",
+            outcome=outcome, max_lag_ms=self._report.max_lag_ms(),
+        )
 
 
-class PowerControl(ttk.Frame):
+class PowerControl(LockableControl, ttk.Frame):
     """UI control for a power-type signal with cooldown timer."""
 
     def __init__(self, parent, state_manager, device, pin, label,
@@ -274,11 +471,12 @@ class PowerControl(ttk.Frame):
         self.cooldown_seconds = int(cooldown_seconds or 0)
         self.write_callback = write_callback
         self._cooldown_after = None
+        self.lock_pins = frozenset([(device, pin)])
 
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
 
-        self.button = tk.Button(self, text=label, command=self.toggle)
+        self.button = tk.Button(self, text=label, command=watched_command(self, self.toggle))
         self.button.grid(row=0, column=0, sticky="nsew")
         self.default_button_bg = self.button.cget("background")
         self.default_button_fg = self.button.cget("foreground")
@@ -291,7 +489,8 @@ class PowerControl(ttk.Frame):
         self.cooldown_label = tk.Label(self, text="", fg="#b00020")
         self.cooldown_label.grid(row=1, column=0, columnspan=2, sticky="w", pady=(2, 0))
 
-        self.refresh()
+        subscribe_widget(self, state_manager, [(device, pin)], lambda _changes: self.refresh())
+        self.render()
 
     def _status_text(self, is_on):
         if self.secondary_label:
@@ -303,19 +502,26 @@ class PowerControl(ttk.Frame):
             return
         if self._cooldown_after is not None:
             self.after_cancel(self._cooldown_after)
-        self.button.configure(state="disabled")
         self._tick_cooldown(self.cooldown_seconds)
 
     def _tick_cooldown(self, remaining):
         if remaining <= 0:
             self.cooldown_label.configure(text="")
-            self.button.configure(state="normal")
             self._cooldown_after = None
+            self._update_button_state()
             return
         self.cooldown_label.configure(text=f"Cooldown {remaining}s")
         self._cooldown_after = self.after(1000, lambda: self._tick_cooldown(remaining - 1))
+        self._update_button_state()
+
+    def _is_disabled(self):
+        return self.unavailable or self._locked or self._cooldown_after is not None
 
     def refresh(self):
+        """Schedule a repaint on the next frame."""
+        get_refresh_scheduler(self).request(self.render)
+
+    def render(self):
         is_on = bool(self.state_manager.get_pin_state(self.device, self.pin))
         if self.secondary_label:
             self.button.configure(text=f"{self.base_label}: {self._status_text(is_on)}")
@@ -336,13 +542,22 @@ class PowerControl(ttk.Frame):
         self.state_manager.set_pin_state(self.device, self.pin, bool(value))
         if self.write_callback is not None:
             self.write_callback(self.device, self.pin, bool(value))
-        self.refresh()
         self._start_cooldown()
 
     def toggle(self):
         current = bool(self.state_manager.get_pin_state(self.device, self.pin))
         self.set_state(not current)
 
+    def reconfigure(self, label, on_color=None, off_color=None, secondary_label=None, cooldown_seconds=0):
+        """Apply new preset appearance without rebuilding the widget."""
+        self.base_label = label
+        self.on_color = on_color
+        self.off_color = off_color
+        self.secondary_label = secondary_label
+        self.cooldown_seconds = int(cooldown_seconds or 0)
+        self.button.configure(text=label)
+        self.render()
+
 
 class InputControl(ttk.Frame):
     """UI control for an input-type signal in the control panel."""
@@ -385,12 +600,16 @@ class InputControl(ttk.Frame):
         device_label = self.device or "Unknown"
         pin_label = self.pin or "Unknown"
         tooltip_text = f"Device: {device_label}\nLine: {pin_label}"
-        HoverTooltip(self.label, tooltip_text)
-        HoverTooltip(self.indicator, tooltip_text)
+        self.tooltips = (HoverTooltip(self.label, tooltip_text), HoverTooltip(self.indicator, tooltip_text))
 
-        self.refresh()
+        self._resubscribe = subscribe_widget(self, state_manager, [(device, pin)], lambda _changes: self.refresh())
+        self.render()
 
     def refresh(self):
+        """Schedule a repaint on the next frame."""
+        get_refresh_scheduler(self).request(self.render)
+
+    def render(self):
         raw_state = bool(self.state_manager.get_pin_state(self.device, self.pin))
         is_active = raw_state if self.active_level == "ACTIVE_HIGH" else not raw_state
         if self.on_color is not None and self.off_color is not None:
@@ -399,46 +618,46 @@ class InputControl(ttk.Frame):
             color = self.indicator.cget("background")
         self.indicator.itemconfig(self._indicator_rect, fill=color)
 
+    def rebind(self, device, pin, **options):
+        """Point a recycled row at another line."""
+        self.device = device
+        self.pin = pin
+        for tooltip in self.tooltips:
+            tooltip.text = f"Device: {device or 'Unknown'}\nLine: {pin or 'Unknown'}"
+        self._resubscribe([(device, pin)])
+        self.reconfigure(**options)
 
-def load_preset_data(preset_file, default_title="", default_info=""):
-    if os.path.exists(preset_file):
-        with open(preset_file, "r") as f:
-            preset_data = json.load(f) or {}
-        return {
-            "title": preset_data.get("title", default_title),
-            "info": preset_data.get("info", default_info),
-        }
-    return {"title": default_title, "info": default_info}
+    def release(self):
+        """Stop following the line while the row sits in the pool."""
+        self._resubscribe(())
 
+    def reconfigure(self, label, on_color=None, off_color=None, active_level="ACTIVE_HIGH"):
+        """Apply new preset appearance without rebuilding the widget."""
+        self.on_color = on_color
+        self.off_color = off_color
+        self.active_level = (active_level or "ACTIVE_HIGH").upper()
+        self.label.configure(text=label)
+        self.render()
 
-def load_preset_file(preset_file):
-    if os.path.exists(preset_file):
-        with open(preset_file, "r") as f:
-            return json.load(f) or {}
-    return {}
 
+def create_control_panel_tab(notebook, state_manager, event_log=None, config=None):
+    """
+    Create and add the Control Panel tab to the notebook.
 
-def create_control_panel_tab(notebook, state_manager):
-    """Create and add the Control Panel tab to the notebook."""
+    ``config`` supplies the selected preset and the configured devices;
+    config.json is read when it is not given.
+    """
+    app_config = load_config() if config is None else config
+    devices = list(app_config.get("devices", []))
     control_panel = ttk.Frame(notebook)
     notebook.add(control_panel, text="Control Panel")
 
-    preset_title = ""
-    preset_info = ""
-    config_file = "config.json"
-    preset_file = "presets/default.json"
-    if os.path.exists(config_file):
-        with open(config_file, "r") as f:
-            config = json.load(f)
-        preset_file = os.path.join("presets", config.get("selected_preset", "default.json"))
-
-    preset_data = load_preset_data(preset_file, preset_title, preset_info)
-    preset_title = preset_data["title"]
-    preset_info = preset_data["info"]
+    preset_file = selected_preset_path(app_config)
 
+    # Title and info are filled in from the compiled preset by build_io_controls
     preset_label = ttk.Label(
         control_panel,
-        text=f"{preset_title}",
+        text="",
         font=("TkDefaultFont", 12, "bold")
     )
     
@@ -454,14 +673,7 @@ def create_control_panel_tab(notebook, state_manager):
     content_frame.rowconfigure(0, weight=1)
 
     info = None
-    if preset_info:
-        info = ttk.Label(
-            control_panel,
-            text=preset_info
-        )
-        info.pack(anchor="w", padx=10, pady=(0, 10), before=content_frame)
-    else:
-        preset_label.pack_configure(pady=(10, 2))
+    preset_label.pack_configure(pady=(10, 2))
 
     def update_preset_info(new_info):
         nonlocal info
@@ -487,116 +699,301 @@ def create_control_panel_tab(notebook, state_manager):
             existing.destroy()
         setattr(control_panel, name, None)
 
+    def existing_section(name):
+        section = getattr(control_panel, name, None)
+        if section is not None and not section.winfo_exists():
+            section = None
+            setattr(control_panel, name, None)
+        return section
+
     def create_io_section(column_index, expand):
-        clear_section("io_section")
-        section = ttk.LabelFrame(content_frame, text="I/O", padding=(6, 4))
+        section = existing_section("io_section")
+        if section is None:
+            section = ttk.LabelFrame(content_frame, text="I/O", padding=(6, 4))
+            section.pack_propagate(True)
+            # Only rows in view get widgets, so large presets build in constant time.
+            io_list = VirtualList(
+                section, create_io_row, bind_io_row, kind=lambda control: control.type, release_row=release_io_row
+            )
+            io_list.pack(fill="both", expand=True)
+            control_panel.io_section = section
+            control_panel.io_list = io_list
         section.grid(row=0, column=column_index, sticky="nsew" if expand else "ns", padx=6, pady=(0, 6))
-        section.pack_propagate(True)
-        control_panel.io_section = section
         return section
 
     def create_right_column(column_index, expand):
-        clear_section("right_column")
-        right_column = ttk.Frame(content_frame)
+        right_column = existing_section("right_column")
+        if right_column is None:
+            right_column = ttk.Frame(content_frame)
+            right_column.columnconfigure(0, weight=1)
+            control_panel.right_column = right_column
         right_column.grid(row=0, column=column_index, sticky="nsew" if expand else "ns", padx=6, pady=(0, 6))
-        right_column.columnconfigure(0, weight=1)
-        control_panel.right_column = right_column
         return right_column
 
     def create_group_sequence_section(right_column, fill_space=False):
-        clear_section("group_sequence_section")
-        section = ttk.LabelFrame(right_column, text="Groups / Sequences", padding=(6, 4))
+        section = existing_section("group_sequence_section")
+        if section is None:
+            section = ttk.LabelFrame(right_column, text="Groups / Sequences", padding=(6, 4))
+            section.columnconfigure(0, weight=1)
+            section.pack_propagate(True)
+            control_panel.group_sequence_section = section
         section.grid(row=0, column=0, sticky="nsew" if fill_space else "ew", pady=(0, 6))
-        section.columnconfigure(0, weight=1)
-        section.pack_propagate(True)
-        control_panel.group_sequence_section = section
         return section
 
     def create_log_section(right_column):
-        clear_section("log_section")
+        section = existing_section("log_section")
+        if section is not None:
+            return section
         section = ttk.LabelFrame(right_column, text="Event Log", padding=(6, 4))
         section.grid(row=1, column=0, sticky="nsew", pady=(0, 6))
         section.columnconfigure(0, weight=1)
-        section.rowconfigure(0, weight=1)
+        section.rowconfigure(1, weight=1)
+
+        filter_row = ttk.Frame(section)
+        filter_row.grid(row=0, column=0, sticky="ew", pady=(0, 4))
+        ttk.Label(filter_row, text="Type:").pack(side=tk.LEFT)
+        type_combo = ttk.Combobox(
+            filter_row, textvariable=log_filter["type"], values=("All",) + EVENT_TYPES,
+            state="readonly", width=13,
+        )
+        type_combo.pack(side=tk.LEFT, padx=(2, 6))
+        for label, key, width in (("Device:", "device", 6), ("Pin:", "pin", 5), ("Search:", "text", 12)):
+            ttk.Label(filter_row, text=label).pack(side=tk.LEFT)
+            ttk.Entry(filter_row, textvariable=log_filter[key], width=width).pack(side=tk.LEFT, padx=(2, 6))
+        ttk.Button(filter_row, text="Export...", command=export_log).pack(side=tk.RIGHT)
+
         text = tk.Text(section, height=6, wrap="word", state="disabled")
-        text.grid(row=0, column=0, sticky="nsew")
+        text.grid(row=1, column=0, sticky="nsew")
         control_panel.log_section = section
         control_panel.log_text = text
+        # A new widget starts empty; refill it from the event log so history survives.
+        apply_log_filter()
         return section
 
     def create_power_section(right_column):
-        clear_section("power_section")
-        section = ttk.LabelFrame(right_column, text="Power", padding=(6, 4))
+        section = existing_section("power_section")
+        if section is None:
+            section = ttk.LabelFrame(right_column, text="Power", padding=(6, 4))
+            section.columnconfigure(0, weight=1)
+            section.pack_propagate(True)
+            power_row = ttk.Frame(section)
+            power_row.grid(row=0, column=0, sticky="ew")
+            control_panel.power_section = section
+            control_panel.power_row = power_row
         section.grid(row=2, column=0, sticky="ew")
-        section.columnconfigure(0, weight=1)
-        section.pack_propagate(True)
-        control_panel.power_section = section
         return section
 
-    def log_event(message):
+    if event_log is None:
+        event_log = EventLog()
+    control_panel.event_log = event_log
+
+    log_capacity = DEFAULT_EVENT_LOG_CAPACITY  # lines kept in the widget; the event log keeps the records
+    pending_log_records = deque(maxlen=DEFAULT_EVENT_LOG_CAPACITY)  # records not yet in the widget
+    log_filter = {key: tk.StringVar(master=control_panel, value="") for key in ("type", "device", "pin", "text")}
+    log_filter["type"].set("All")
+
+    def set_log_capacity(capacity):
+        nonlocal log_capacity, pending_log_records
+        log_capacity = max(1, int(capacity))
+        pending_log_records = deque(pending_log_records, maxlen=log_capacity)
+
+    def current_filter():
+        event_type = log_filter["type"].get()
+        return {
+            "event_type": None if event_type == "All" else event_type,
+            "device": log_filter["device"].get().strip() or None,
+            "pin": log_filter["pin"].get().strip() or None,
+            "text": log_filter["text"].get() or None,
+        }
+
+    def matches_filter(record, event_type=None, device=None, pin=None, text=None):
+        return ((not event_type or record.type == event_type)
+                and (not device or record.device == device)
+                and (not pin or record.pin == pin)
+                and (not text or text in record.message))
+
+    def log_event(message, event_type="info", device=None, pin=None, **data):
+        record = event_log.record(event_type, message, device, pin, **data)
+        if getattr(control_panel, "log_text", None) is None:
+            return
+        if matches_filter(record, **current_filter()):
+            pending_log_records.append(record)
+            get_refresh_scheduler(control_panel).request(flush_log)
+
+    def flush_log():
+        """Insert queued records in one edit and trim the widget to the log capacity."""
         log_text = getattr(control_panel, "log_text", None)
-        if log_text is None:
+        if log_text is None or not pending_log_records:
+            pending_log_records.clear()
             return
-        timestamp = time.strftime("%H:%M:%S")
+        start = time.perf_counter()
+        LOG_INSERTS.inc(len(pending_log_records))
+        text = "".join(record.format() + "\n" for record in pending_log_records)
+        pending_log_records.clear()
         log_text.configure(state="normal")
-        log_text.insert("end", f"[{timestamp}] {message}\n")
+        log_text.insert("end", text)
+        line_count = int(log_text.index("end-1c").split(".")[0]) - 1
+        excess = line_count - log_capacity
+        if excess > 0:
+            log_text.delete("1.0", f"{excess + 1}.0")
         log_text.see("end")
         log_text.configure(state="disabled")
+        LOG_FLUSH_TIME.observe((time.perf_counter() - start) * 1e6)
+
+    def apply_log_filter(*_args):
+        """Refill the widget from the indexed event log using the current filter."""
+        log_text = getattr(control_panel, "log_text", None)
+        if log_text is None:
+            return
+        pending_log_records.clear()
+        pending_log_records.extend(event_log.query(limit=log_capacity, **current_filter()))
+        log_text.configure(state="normal")
+        log_text.delete("1.0", "end")
+        log_text.configure(state="disabled")
+        flush_log()
+
+    for variable in log_filter.values():
+        variable.trace_add("write", apply_log_filter)
+
+    def export_log():
+        path = filedialog.asksaveasfilename(
+            parent=control_panel,
+            title="Export Event Log",
+            defaultextension=".jsonl",
+            filetypes=(("JSON Lines", "*.jsonl"), ("CSV", "*.csv")),
+        )
+        if path:
+            count = event_log.export(path, event_log.query(**current_filter()))
+            log_event(f"Exported {count} events to {path}")
 
     control_panel.log_event = log_event
 
-    def set_controls_state(state):
-        for output_control in getattr(control_panel, "output_controls", []):
-            output_control.button.configure(state=state)
-        for input_control in getattr(control_panel, "input_controls", []):
-            input_control.label.configure(state=state)
-        for power_control in getattr(control_panel, "power_controls", []):
-            power_control.button.configure(state=state)
-        for group_control in getattr(control_panel, "group_controls", []):
-            group_control.button.configure(state=state)
-        for sequence_control in getattr(control_panel, "sequence_controls", []):
-            sequence_control.button.configure(state=state)
+    pin_locks = PinLockManager()
+    control_panel.pin_locks = pin_locks
+
+    def io_controls(control_type):
+        """Return the I/O widgets currently on screen for ``control_type``."""
+        io_list = getattr(control_panel, "io_list", None)
+        if io_list is None or not io_list.winfo_exists():
+            return []
+        return [widget for control, widget in io_list.visible_widgets() if control.type == control_type]
+
+    def apply_pin_locks(locked):
+        """Disable only the controls that touch a pin held by a running sequence."""
+        controls = io_controls("output")
+        for name in ("power_controls", "group_controls", "sequence_controls"):
+            controls.extend(getattr(control_panel, name, []))
+        for control in controls:
+            control.set_locked(not locked.isdisjoint(control.lock_pins))
+
+    pin_locks.add_listener(apply_pin_locks)
+
+    control_widgets = {}  # control id -> (signature, widget), kept across rebuilds
+    packed_order = {}  # container -> widgets in the order they were last packed
+    control_panel.preset = None
+
+    def build_control(control, parent):
+        options = control.options()
+        if control.type == "output":
+            return OutputControl(parent, state_manager, control.device, control.pin, **options)
+        if control.type == "input":
+            return InputControl(parent, state_manager, control.device, control.pin, **options)
+        if control.type == "power":
+            return PowerControl(parent, state_manager, control.device, control.pin, **options)
+        if control.type == "group":
+            widget = GroupControl(parent, state_manager, port_masks=control.port_masks, **options)
+            widget.log_callback = log_event
+            return widget
+        if control.type == "sequence":
+            return SequenceControl(
+                parent, state_manager, plan=control.plan,
+                pin_locks=pin_locks, log_callback=log_event, **options,
+            )
+        return ttk.Frame(parent, height=8)
+
+    def apply_row_state(widget, control):
+        if control.type == "output":
+            widget.set_available(control.available is not False)
+            widget.set_locked(not pin_locks.locked_pins().isdisjoint(widget.lock_pins))
+
+    def create_io_row(parent, control):
+        widget = build_control(control, parent)
+        apply_row_state(widget, control)
+        return widget
+
+    def bind_io_row(widget, control):
+        if control.type != "break":
+            widget.rebind(control.device, control.pin, **control.options())
+        apply_row_state(widget, control)
+
+    def release_io_row(widget):
+        if hasattr(widget, "release"):
+            widget.release()
+
+    def pack_in_order(container, widgets):
+        """Repack a container only when its children or their order changed."""
+        if packed_order.get(container) == widgets:
+            return
+        for widget in packed_order.get(container, []):
+            if widget.winfo_exists():
+                widget.pack_forget()
+        for widget in widgets:
+            widget.pack(fill="x", anchor="w", pady=2)
+        packed_order[container] = widgets
+
+    def grid_power_row(power_row, widgets):
+        previous = packed_order.get(power_row, [])
+        if previous == widgets:
+            return
+        for index, widget in enumerate(widgets):
+            widget.grid(row=0, column=index, padx=4, pady=2, sticky="ew")
+            power_row.columnconfigure(index, weight=1)
+        for index in range(len(widgets), len(previous)):
+            power_row.columnconfigure(index, weight=0)
+        packed_order[power_row] = widgets
 
     def build_io_controls(preset_path):
-        output_controls = []
-        input_controls = []
-        power_controls = []
-        group_controls = []
-        sequence_controls = []
-        clear_section("io_section")
-        clear_section("power_section")
-        clear_section("group_sequence_section")
-        clear_section("log_section")
-        clear_section("right_column")
-        control_panel.log_text = None
-
-        power_row = None
-        power_index = 0
-
-        configured_devices = set()
-        if os.path.exists(config_file):
-            with open(config_file, "r") as f:
-                cfg = json.load(f) or {}
-            configured_devices = set(cfg.get("devices", []))
-
-        preset = load_preset_file(preset_path)
-        layout = preset.get("layout", {})
-        controls = layout.get("controls", [])
-        event_log_enabled = bool(preset.get("event_log", False))
-
-        has_io = any(c.get("type", "").lower() in {"output", "input", "break"} for c in controls)
-        has_power = any(c.get("type", "").lower() == "power" for c in controls)
-        has_group_seq = any(c.get("type", "").lower() in {"group", "sequence"} for c in controls)
+        """Reconcile the panel with a preset, touching only controls that changed.
+
+        Controls are matched by preset id. Appearance changes are applied in
+        place, changes to wiring (device, pin, actions, steps) replace the
+        widget, and sections or controls the preset no longer has are removed.
+        I/O rows are handed to the virtual list, which rebinds recycled rows.
+        An invalid preset is reported in the event log and leaves the panel as is.
+        """
+        try:
+            preset = load_compiled_preset(preset_path, devices)
+        except PresetError as exc:
+            log_event(f"Error loading preset {exc.source}: {len(exc.errors)} error(s)")
+            for path, message in exc.errors:
+                log_event(f"Preset {exc.source}: {path}: {message}")
+            return False
+        if preset is not control_panel.preset:
+            for path, message in preset.warnings:
+                log_event(f"Preset {preset.source}: {path}: {message}")
+        control_panel.preset = preset
+        update_preset_title(preset.title)
+        update_preset_info(preset.info)
+
+        set_log_capacity(preset.event_log_capacity)
+        state_manager.set_input_ports(preset.input_ports)
+
+        event_log_enabled = preset.event_log
+        has_io = preset.has("output", "input", "break")
+        has_power = preset.has("power")
+        has_group_seq = preset.has("group", "sequence")
         has_right = has_power or has_group_seq or event_log_enabled
 
         if has_io and not has_right:
             content_frame.columnconfigure(0, weight=1)
             content_frame.columnconfigure(1, weight=0)
+            clear_section("right_column")
             io_section = create_io_section(column_index=0, expand=True)
             right_column = None
         elif has_right and not has_io:
             content_frame.columnconfigure(0, weight=1)
             content_frame.columnconfigure(1, weight=0)
+            clear_section("io_section")
             io_section = None
             right_column = create_right_column(column_index=0, expand=True)
         else:
@@ -606,142 +1003,95 @@ def create_control_panel_tab(notebook, state_manager):
             right_column = create_right_column(column_index=1, expand=True) if has_right else None
 
         group_container = None
-        power_container = None
+        power_row = None
         if right_column is not None:
             right_column.rowconfigure(0, weight=1 if (has_group_seq and not event_log_enabled) else 0)
             right_column.rowconfigure(1, weight=1 if event_log_enabled else 0)
             if has_group_seq:
                 group_container = create_group_sequence_section(right_column, fill_space=not event_log_enabled)
+            else:
+                clear_section("group_sequence_section")
             if event_log_enabled:
                 create_log_section(right_column)
+            else:
+                clear_section("log_section")
+                control_panel.log_text = None
             if has_power:
-                power_container = create_power_section(right_column)
-                power_row = ttk.Frame(power_container)
-                power_row.grid(row=0, column=0, sticky="ew")
-                power_row.columnconfigure(0, weight=1)
-
-        for control in controls:
-            control_type = control.get("type", "").lower()
-            if control_type == "output":
-                if io_section is None:
-                    continue
-                output_widget = OutputControl(
-                    io_section,
-                    state_manager,
-                    control.get("device", ""),
-                    control.get("pin", ""),
-                    control.get("label", control.get("id", "")),
-                    on_color=control.get("on_color"),
-                    off_color=control.get("off_color"),
-                    secondary_label=control.get("secondary_label"),
-                )
-                if output_widget.device not in configured_devices:
-                    output_widget.button.configure(state="disabled", foreground="#b00020")
-                output_widget.pack(fill="x", anchor="w", pady=2)
-                output_controls.append(output_widget)
-            elif control_type == "input":
-                if io_section is None:
-                    continue
-                input_widget = InputControl(
-                    io_section,
-                    state_manager,
-                    control.get("device", ""),
-                    control.get("pin", ""),
-                    control.get("label", control.get("id", "")),
-                    on_color=control.get("on_color"),
-                    off_color=control.get("off_color"),
-                    active_level=control.get("active_level", "ACTIVE_HIGH"),
-                )
-                input_widget.pack(fill="x", anchor="w", pady=2)
-                input_controls.append(input_widget)
-            elif control_type == "power":
-                if power_container is None:
-                    continue
-                power_widget = PowerControl(
-                    power_row,
-                    state_manager,
-                    control.get("device", ""),
-                    control.get("pin", ""),
-                    control.get("label", control.get("id", "")),
-                    on_color=control.get("on_color"),
-                    off_color=control.get("off_color"),
-                    secondary_label=control.get("secondary_label"),
-                    cooldown_seconds=control.get("cooldown_seconds", 0),
-                )
-                if power_widget.device not in configured_devices:
-                    power_widget.button.configure(state="disabled", foreground="#b00020")
-                power_widget.grid(row=0, column=power_index, padx=4, pady=2, sticky="ew")
-                power_row.columnconfigure(power_index, weight=1)
-                power_index += 1
-                power_controls.append(power_widget)
-            elif control_type == "group":
-                if group_container is None:
-                    continue
-                group_widget = GroupControl(
-                    group_container,
-                    state_manager,
-                    control.get("label", control.get("id", "")),
-                    control.get("actions", []),
-                    on_color=control.get("on_color", "#4CAF50"),
-                    off_color=control.get("off_color", "#cac9c8"),
-                )
-                group_widget.log_callback = log_event
-                group_widget.pack(fill="x", anchor="w", pady=2)
-                group_controls.append(group_widget)
-            elif control_type == "sequence":
-                if group_container is None:
-                    continue
-                seq_widget = SequenceControl(
-                    group_container,
-                    state_manager,
-                    control.get("label", control.get("id", "")),
-                    control.get("steps", []),
-                    disable_callback=lambda: set_controls_state("disabled"),
-                    enable_callback=lambda: set_controls_state("normal"),
-                    log_callback=log_event,
-                )
-                seq_widget.pack(fill="x", anchor="w", pady=2)
-                sequence_controls.append(seq_widget)
-            elif control_type == "break":
-                if io_section is None:
-                    continue
-                spacer = ttk.Frame(io_section, height=8)
-                spacer.pack(fill="x", pady=4)
-
-        control_panel.output_controls = output_controls
-        control_panel.input_controls = input_controls
-        control_panel.power_controls = power_controls
-        control_panel.group_controls = group_controls
-        control_panel.sequence_controls = sequence_controls
-
-    def rebuild_from_preset(preset_path):
-        build_io_controls(preset_path)
+                create_power_section(right_column)
+                power_row = control_panel.power_row
+            else:
+                clear_section("power_section")
+        else:
+            control_panel.log_text = None
+
+        if io_section is not None:
+            control_panel.io_list.set_items(preset.of_type(*IO_TYPES))
+
+        containers = {"power": power_row, "group": group_container, "sequence": group_container}
+        placed = {power_row: [], group_container: []}
+        by_type = {control_type: [] for control_type in containers}
+        seen = set()
+
+        for control in preset.controls:
+            parent = containers.get(control.type)
+            if parent is None:
+                continue
+            seen.add(control.id)
+            signature = (control.type, str(parent), control.available, control.structure)
+            previous_signature, widget = control_widgets.get(control.id, (None, None))
+            if widget is not None and previous_signature == signature and widget.winfo_exists():
+                widget.reconfigure(**control.options())
+            else:
+                if widget is not None and widget.winfo_exists():
+                    widget.destroy()
+                widget = build_control(control, parent)
+                if control.available is False:
+                    widget.mark_unavailable()
+            control_widgets[control.id] = (signature, widget)
+            placed[parent].append(widget)
+            by_type[control.type].append(widget)
+
+        for control_id in list(control_widgets):
+            if control_id not in seen:
+                _signature, widget = control_widgets.pop(control_id)
+                if widget.winfo_exists():
+                    widget.destroy()
+
+        for container in list(packed_order):
+            if not container.winfo_exists():
+                del packed_order[container]
+        if group_container is not None:
+            pack_in_order(group_container, placed[group_container])
+        if power_row is not None:
+            grid_power_row(power_row, placed[power_row])
+
+        control_panel.power_controls = by_type["power"]
+        control_panel.group_controls = by_type["group"]
+        control_panel.sequence_controls = by_type["sequence"]
+        apply_pin_locks(pin_locks.locked_pins())
+        return True
+
+    def rebuild_from_preset(preset_path, new_devices=None):
+        """Rebuild from ``preset_path``, optionally for a new list of devices."""
+        nonlocal devices
+        if new_devices is not None:
+            devices = list(new_devices)
+        return build_io_controls(preset_path)
 
     control_panel.rebuild_from_preset = rebuild_from_preset
 
-    def refresh_output_controls():
-        for output_control in getattr(control_panel, "output_controls", []):
-            output_control.refresh()
-
-    control_panel.refresh_output_controls = refresh_output_controls
-
-    def refresh_input_controls():
-        for input_control in getattr(control_panel, "input_controls", []):
-            input_control.refresh()
-
-    control_panel.refresh_input_controls = refresh_input_controls
-
-    def refresh_group_controls():
-        for group_control in getattr(control_panel, "group_controls", []):
-            group_control.refresh()
-
-    control_panel.refresh_group_controls = refresh_group_controls
-
-    def refresh_power_controls():
-        for power_control in getattr(control_panel, "power_controls", []):
-            power_control.refresh()
-
-    control_panel.refresh_power_controls = refresh_power_controls
+    def run_control(control):
+        """Press the button of a group or sequence ``control``; returns the outcome."""
+        _signature, widget = control_widgets.get(control.id, (None, None))
+        if widget is None or not widget.winfo_exists():
+            return "unknown"
+        if widget.unavailable:
+            return "unavailable"
+        if not widget.can_run():
+            return "busy"
+        return widget.run()
+
+    control_panel.run_control = run_control
 
     build_io_controls(preset_file)
 
@@ -1,214 +1,303 @@
 from tkinter import ttk
 import tkinter as tk
+from .lazy_tabs import get_lazy_tabs
+from .refresh_scheduler import get_refresh_scheduler
+from .stall_watch import watched_command
 
 BUTTON_PADX = 15
 ON_COLOR  = "#4CAF50"   # green
 OFF_COLOR = "#cac9c8"   # default bg
 UTIL_COLOR = "#B0BEC5"   # muted gray
+STAGED_COLOR = "blue"
 
+# Pin grid geometry, in canvas pixels
+CELL_WIDTH = 25 + 2 * BUTTON_PADX
+CELL_HEIGHT = 62
+BOX_SIZE = 25
+CHECK_SIZE = 15
 
-def create_device_tab(notebook, dev, state_manager):
-    states = state_manager.state.get(dev, {})
-    buttons = {}
-    button_vars = {}  # Store IntVars to revert checkbutton states
-    button_frames = {}  # Store frames around checkbuttons for styling
-    diagram_labels = {}
+# Diagram geometry
+DIAGRAM_PIN_WIDTH = 120
+DIAGRAM_PIN_HEIGHT = 24
+DIAGRAM_PIN_GAP = 4
+DIAGRAM_BODY_WIDTH = 170
+
+
+def create_device_tab(notebook, dev, state_manager, pin_locks=None):
+    """
+    Add a tab for ``dev``; its widgets are built the first time it is selected.
+
+    Lines held in ``pin_locks`` by a running sequence are not written.
+    """
+    return get_lazy_tabs(notebook).add(dev, lambda page: build_device_tab(page, dev, state_manager, pin_locks))
+
+
+def build_device_tab(dev_tab, dev, state_manager, pin_locks=None):
+    states = {}
+    for port in range(3):
+        port_value = state_manager.read_port(dev, port)
+        for bit in range(8):
+            states[f"p{port}.{bit}"] = bool(port_value >> bit & 1)
+    grid_items = {}  # key -> (box item, check item)
+    diagram_items = {}  # key -> pin rectangle item on the diagram canvas
     diagram_window = None
+    diagram_canvas = None
     staged_changes = {}  # Track changes not yet written
-    dev_tab = ttk.Frame(notebook)
-    notebook.add(dev_tab, text=dev)
+    dirty_pins = {}  # Line changes waiting for the next frame
+    subscription = None  # held only while the tab or its diagram is on screen
+    tab_visible = True
 
-    # Frame around buttons
+    # Frame around the pin grid
     signals_frame = ttk.LabelFrame(dev_tab, text="Digital Signals", padding=(5, 2))
     signals_frame.pack(padx=15, pady=20, anchor="w")
-    
+
     # Get the default background color for frames (cross-platform)
     default_bg = tk.Frame(signals_frame).cget('background')
 
-    # No dynamic spacing to keep compact
+    # All 24 lines are items on one canvas: no per-line widgets to create or reconfigure.
+    grid_canvas = tk.Canvas(
+        signals_frame,
+        width=8 * CELL_WIDTH,
+        height=3 * CELL_HEIGHT,
+        background=default_bg,
+        highlightthickness=0,
+        bd=0,
+    )
+    grid_canvas.pack()
+
+    def diagram_open():
+        return diagram_canvas is not None and diagram_canvas.winfo_exists()
 
     def update_diagram_colors():
-        """Update all diagram label colors based on current states"""
-        for key, label in diagram_labels.items():
-            state = states.get(key, False)
-            label.configure(bg=ON_COLOR if state else OFF_COLOR)
+        """Update all diagram pin colors based on current states"""
+        if not diagram_open():
+            return
+        for key, item in diagram_items.items():
+            diagram_canvas.itemconfig(item, fill=ON_COLOR if states.get(key, False) else OFF_COLOR)
+
+    def show_pin(key):
+        """Draw a grid cell: checked for the staged or current value, outlined while staged."""
+        box, check = grid_items[key]
+        checked = staged_changes.get(key, states.get(key, False))
+        grid_canvas.itemconfig(check, state="normal" if checked else "hidden")
+        grid_canvas.itemconfig(box, outline=STAGED_COLOR if key in staged_changes else default_bg)
 
     def refresh_from_state():
         """Refresh UI from the current state manager values."""
         for port in range(3):
+            port_value = state_manager.read_port(dev, port)
             for bit in range(8):
                 key = f"p{port}.{bit}"
-                current_state = state_manager.get_pin_state(dev, key)
-                states[key] = current_state
-                if key in button_vars and key not in staged_changes:
-                    button_vars[key].set(1 if current_state else 0)
+                states[key] = bool(port_value >> bit & 1)
+                show_pin(key)
         update_diagram_colors()
 
-    def toggle_signal(port, bit, var):
+    def refresh_pins(changes):
+        """Queue the lines named in ``changes`` for the next frame."""
+        for _device, key, value in changes:
+            dirty_pins[key] = bool(value)
+        get_refresh_scheduler(dev_tab).request(render_pins)
+
+    def render_pins():
+        pending = dict(dirty_pins)
+        dirty_pins.clear()
+        for key, value in pending.items():
+            states[key] = value
+            if key in grid_items:
+                show_pin(key)
+            item = diagram_items.get(key)
+            if item is not None and diagram_open():
+                diagram_canvas.itemconfig(item, fill=ON_COLOR if value else OFF_COLOR)
+
+    def toggle_signal(port, bit):
         """Stage a signal change with visual indication"""
         key = f"p{port}.{bit}"
-        new_state = bool(var.get())
-        
-        # Stage the change
-        staged_changes[key] = new_state
-        
-        # Change outline color to indicate pending change
-        if key in button_frames:
-            button_frames[key].configure(highlightbackground="blue", highlightcolor="blue")
-    
+        new_state = not staged_changes.get(key, states.get(key, False))
+        if new_state == states.get(key, False):
+            # Toggled back to the current value: nothing left to write
+            staged_changes.pop(key, None)
+        else:
+            staged_changes[key] = new_state
+        show_pin(key)
+
+    def on_grid_click(event):
+        """Hit-test a click against the cell grid and toggle the box under it."""
+        bit, port = event.x // CELL_WIDTH, event.y // CELL_HEIGHT
+        if not (0 <= bit < 8 and 0 <= port < 3):
+            return
+        x0, y0 = bit * CELL_WIDTH + BUTTON_PADX, port * CELL_HEIGHT + 20
+        if x0 <= event.x <= x0 + BOX_SIZE and y0 <= event.y <= y0 + BOX_SIZE:
+            toggle_signal(port, bit)
+
     def write_ports():
-        """Write all staged changes to state manager and update displays"""
-        for key, new_state in staged_changes.items():
-            states[key] = new_state
-            state_manager.set_pin_state(dev, key, new_state)
-            
-            # Reset outline to default background
-            if key in button_frames:
-                button_frames[key].configure(highlightbackground=default_bg)
-        
-        # Clear staged changes
-        staged_changes.clear()
-        
+        """Write staged changes to state manager, except lines a running sequence holds"""
+        locked = pin_locks.locked_pins() if pin_locks is not None else frozenset()
+        written = [key for key in staged_changes if (dev, key) not in locked]
+        with state_manager.batch():
+            for key in written:
+                states[key] = staged_changes[key]
+                state_manager.set_pin_state(dev, key, staged_changes[key])
+
+        # Clear written changes and reset their outlines; held lines stay staged
+        for key in written:
+            del staged_changes[key]
+            show_pin(key)
+        if staged_changes:
+            status_var.set(f"In use by a running sequence, left staged: {', '.join(sorted(staged_changes))}")
+        else:
+            status_var.set("")
+
         # Update diagram
         update_diagram_colors()
-    
+
     def revert_changes():
         """Revert all staged changes back to their original states"""
-        for key in list(staged_changes.keys()):
-            # Reset checkbutton to match actual state
-            if key in button_vars:
-                original_state = states.get(key, False)
-                button_vars[key].set(1 if original_state else 0)
-            
-            # Remove blue outline
-            if key in button_frames:
-                button_frames[key].configure(highlightbackground=default_bg)
-        
-        # Clear staged changes
+        reverted = list(staged_changes)
         staged_changes.clear()
+        status_var.set("")
+        for key in reverted:
+            show_pin(key)
 
     for port in range(3):
         for bit in range(8):
             key = f"p{port}.{bit}"
-            state = states.get(key, False)
-            label = ttk.Label(signals_frame, text=key)
-            label.grid(row=port*3, column=bit, padx=5, pady=(5,0), sticky="n")
-            
-            # Frame around checkbutton for styling - fixed size to prevent resizing
-            chk_frame = tk.Frame(signals_frame, highlightthickness=2, highlightbackground=default_bg, width=25, height=25)
-            chk_frame.grid(row=port*3+1, column=bit, padx=BUTTON_PADX, pady=(0,0))
-            chk_frame.grid_propagate(False)  # Maintain fixed size
-            button_frames[key] = chk_frame
-            
-            var = tk.IntVar(value=1 if state else 0)
-            button_vars[key] = var
-            chk = ttk.Checkbutton(chk_frame, variable=var, command=lambda p=port, b=bit, v=var: toggle_signal(p, b, v), takefocus=0)
-            chk.place(relx=0.5, rely=0.5, anchor="center")  # Center horizontally and vertically
-            
-            status_label = ttk.Label(signals_frame, text="")
-            status_label.grid(row=port*3+2, column=bit, padx=5, pady=(0,5), sticky="n")
-            buttons[key] = chk
-    
+            x0, y0 = bit * CELL_WIDTH, port * CELL_HEIGHT
+            grid_canvas.create_text(x0 + CELL_WIDTH // 2, y0 + 10, text=key)
+            # Outer box shows the staged outline, inner square the check
+            box = grid_canvas.create_rectangle(
+                x0 + BUTTON_PADX, y0 + 20, x0 + BUTTON_PADX + BOX_SIZE, y0 + 20 + BOX_SIZE,
+                outline=default_bg, width=2,
+            )
+            inset = (BOX_SIZE - CHECK_SIZE) // 2
+            grid_canvas.create_rectangle(
+                x0 + BUTTON_PADX + inset, y0 + 20 + inset,
+                x0 + BUTTON_PADX + inset + CHECK_SIZE, y0 + 20 + inset + CHECK_SIZE,
+                outline="#5a5a5a", fill="#ffffff",
+            )
+            check = grid_canvas.create_line(
+                x0 + BUTTON_PADX + inset + 3, y0 + 20 + inset + 8,
+                x0 + BUTTON_PADX + inset + 6, y0 + 20 + inset + 12,
+                x0 + BUTTON_PADX + inset + 12, y0 + 20 + inset + 3,
+                width=2, fill="#1f1f1f",
+            )
+            grid_items[key] = (box, check)
+            show_pin(key)
+    grid_canvas.bind("<Button-1>", watched_command(grid_canvas, on_grid_click))
+
     # Device diagram
     pin_functions = { 1: "GND", 2: "+5V", 3: "p0.0", 4: "p0.1", 5: "p0.2", 6: "p0.3", 7: "GND", 8: "GND", 9: "p0.4", 10: "p0.5", 11: "p0.6", 12: "p0.7", 13: "p1.0", 14: "p1.1", 15: "p1.2", 16: "p1.3", 17: "p2.0", 18: "p2.1", 19: "p2.2", 20: "p2.3", 21: "p2.4", 22: "p2.5", 23: "p2.6", 24: "p2.7", 25: "GND", 26: "GND", 27: "p1.4", 28: "p1.5", 29: "p1.6", 30: "p1.7", 31: "+5V", 32: "GND" }
 
     def open_diagram_window():
-        nonlocal diagram_window
+        nonlocal diagram_window, diagram_canvas
         if diagram_window is not None and diagram_window.winfo_exists():
             diagram_window.lift()
             return
-        
+
         diagram_window = tk.Toplevel(dev_tab)
         diagram_window.title(f"{dev} - Device Diagram")
         diagram_window.geometry("600x650")
         diagram_window.minsize(400, 500)
-        
-        create_diagram(diagram_window, pin_functions, states, diagram_labels)
 
-    def create_diagram(parent, pin_functions, states, diagram_labels):
-        """Create device diagram in given parent widget"""
-        diagram_frame = ttk.Frame(parent, padding=(10,10))
-        diagram_frame.pack(expand=True)
+        diagram_canvas = create_diagram(diagram_window, pin_functions, states, diagram_items)
+        diagram_window.bind(
+            "<Destroy>",
+            lambda event: dev_tab.after_idle(update_subscription) if event.widget is diagram_window else None,
+            add="+",
+        )
+
+    def create_diagram(parent, pin_functions, states, diagram_items):
+        """Draw the device diagram on one canvas in the given parent widget"""
+        row_pitch = DIAGRAM_PIN_HEIGHT + DIAGRAM_PIN_GAP
+        width = 2 * DIAGRAM_PIN_WIDTH + DIAGRAM_BODY_WIDTH + 40
+        top = 50
+        height = top + 16 * row_pitch + 10
+        canvas = tk.Canvas(parent, width=width, height=height, highlightthickness=0, bd=0)
+        canvas.pack(expand=True)
 
         # Device name header
-        device_header = tk.Label(
-            diagram_frame,
-            text=f"Device: {dev}",
-            font=("TkDefaultFont", 12, "bold"),
-            pady=10
-        )
-        device_header.grid(row=0, column=0, columnspan=3, pady=(0, 10))
+        canvas.create_text(width // 2, 20, text=f"Device: {dev}", font=("TkDefaultFont", 12, "bold"))
 
         # Device body (center box) - full height
-        body = tk.Label(
-            diagram_frame,
-            text="USB-6501\n24-line Digital I/O",
-            relief="groove",
-            width=22,
-            justify="center",
-            font=("TkDefaultFont", 9, "bold")
+        body_x = 10 + DIAGRAM_PIN_WIDTH + 10
+        canvas.create_rectangle(
+            body_x, top, body_x + DIAGRAM_BODY_WIDTH, top + 16 * row_pitch - DIAGRAM_PIN_GAP,
+            outline="#8a8a8a", width=2,
+        )
+        canvas.create_text(
+            body_x + DIAGRAM_BODY_WIDTH // 2, top + 8 * row_pitch,
+            text="USB-6501\n24-line Digital I/O", justify="center", font=("TkDefaultFont", 9, "bold"),
         )
-        body.grid(row=1, column=1, rowspan=16, padx=10, pady=2, sticky="ns")
 
+        diagram_items.clear()
         for row in range(16):
-            # ---------- Left rail (pins 1–16) ----------
-            pin_left = row + 1
-            func_left = pin_functions.get(pin_left, "NC")
-
-            lbl_left = tk.Label(
-                diagram_frame,
-                text=f"Pin {pin_left} : {func_left}",
-                relief="sunken",
-                width=12,
-                justify="center"
-            )
-
-            if func_left.startswith("p"):
-                state = states.get(func_left, False)
-                lbl_left.configure(bg=ON_COLOR if state else OFF_COLOR)
-                diagram_labels[func_left] = lbl_left
-            else:
-                lbl_left.configure(bg=UTIL_COLOR)
-
-            lbl_left.grid(row=row+1, column=0, padx=2, pady=2)
-
-            # ---------- Right rail (pins 17–32) ----------
-            pin_right = 17 + row
-            func_right = pin_functions.get(pin_right, "NC")
-
-            lbl_right = tk.Label(
-                diagram_frame,
-                text=f"Pin {pin_right} : {func_right}",
-                relief="sunken",
-                width=12,
-                justify="center"
-            )
-
-            if func_right.startswith("p"):
-                state = states.get(func_right, False)
-                lbl_right.configure(bg=ON_COLOR if state else OFF_COLOR)
-                diagram_labels[func_right] = lbl_right
-            else:
-                lbl_right.configure(bg=UTIL_COLOR)
-
-            lbl_right.grid(row=row+1, column=2, padx=2, pady=2)
+            y0 = top + row * row_pitch
+            # Left rail (pins 1-16), right rail (pins 17-32)
+            for pin, x0 in ((row + 1, 10), (17 + row, body_x + DIAGRAM_BODY_WIDTH + 10)):
+                func = pin_functions.get(pin, "NC")
+                if func.startswith("p"):
+                    fill = ON_COLOR if states.get(func, False) else OFF_COLOR
+                else:
+                    fill = UTIL_COLOR
+                item = canvas.create_rectangle(
+                    x0, y0, x0 + DIAGRAM_PIN_WIDTH, y0 + DIAGRAM_PIN_HEIGHT, fill=fill, outline="#5a5a5a",
+                )
+                canvas.create_text(x0 + DIAGRAM_PIN_WIDTH // 2, y0 + DIAGRAM_PIN_HEIGHT // 2, text=f"Pin {pin} : {func}")
+                if func.startswith("p"):
+                    diagram_items[func] = item
+        return canvas
 
     # Buttons frame
     buttons_frame = ttk.Frame(dev_tab)
     buttons_frame.pack(padx=15, pady=(0, 10), anchor="w")
     
     # Write Ports button
-    write_button = ttk.Button(buttons_frame, text="Write Ports", command=write_ports, style="Accent.TButton")
+    write_button = ttk.Button(buttons_frame, text="Write Ports", command=watched_command(buttons_frame, write_ports), style="Accent.TButton")
     write_button.pack(side="left", padx=(0, 10))
     
     # Revert button
-    revert_button = ttk.Button(buttons_frame, text="Revert Changes", command=revert_changes)
+    revert_button = ttk.Button(buttons_frame, text="Revert Changes", command=watched_command(buttons_frame, revert_changes))
     revert_button.pack(side="left", padx=(0, 10))
     
     # Device diagram button
-    diagram_button = ttk.Button(buttons_frame, text="Open Device Diagram", command=open_diagram_window)
+    diagram_button = ttk.Button(buttons_frame, text="Open Device Diagram", command=watched_command(buttons_frame, open_diagram_window))
     diagram_button.pack(side="left")
 
-    dev_tab.refresh_from_state = refresh_from_state
+    status_var = tk.StringVar(master=dev_tab, value="")
+    ttk.Label(dev_tab, textvariable=status_var, foreground="#b00020").pack(padx=15, anchor="w")
 
+    def update_subscription():
+        """Follow state changes only while something shows them; catch up on resume."""
+        nonlocal subscription
+        wanted = dev_tab.winfo_exists() and (tab_visible or diagram_open())
+        if wanted and subscription is None:
+            refresh_from_state()
+            subscription = state_manager.subscribe(
+                [(dev, f"p{port}.{bit}") for port in range(3) for bit in range(8)],
+                refresh_pins,
+            )
+        elif not wanted and subscription is not None:
+            state_manager.unsubscribe(subscription)
+            subscription = None
+            dirty_pins.clear()
+
+    def on_show():
+        nonlocal tab_visible
+        tab_visible = True
+        update_subscription()
+
+    def on_hide():
+        nonlocal tab_visible
+        tab_visible = False
+        update_subscription()
 
+    def on_destroy(event):
+        nonlocal subscription
+        if event.widget is dev_tab and subscription is not None:
+            state_manager.unsubscribe(subscription)
+            subscription = None
+
+    dev_tab.bind("<Destroy>", on_destroy, add="+")
+    dev_tab.refresh_from_state = refresh_from_state
+    dev_tab.on_show = on_show
+    dev_tab.on_hide = on_hide
+    update_subscription()
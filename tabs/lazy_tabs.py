@@ -0,0 +1,65 @@
+from tkinter import ttk
+
+
+class LazyTabs:
+    """
+    Builds notebook pages on first selection and tells them when they are
+    shown or hidden.
+
+    ``add`` inserts an empty page; ``build(page)`` runs the first time the
+    page is selected. Built pages may define ``on_show()`` and ``on_hide()``
+    to suspend work while another tab is in front.
+    """
+
+    def __init__(self, notebook):
+        self.notebook = notebook
+        self._builders = {}  # page path -> build callback
+        self._current = None
+        notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed, add="+")
+
+    def add(self, text, build):
+        page = ttk.Frame(self.notebook)
+        self.notebook.add(page, text=text)
+        self._builders[str(page)] = build
+        page.bind("<Destroy>", lambda event: self._forget(page) if event.widget is page else None, add="+")
+        return page
+
+    def is_built(self, page):
+        return str(page) not in self._builders
+
+    def _forget(self, page):
+        self._builders.pop(str(page), None)
+        if self._current == str(page):
+            self._current = None
+
+    def _page(self, path):
+        try:
+            page = self.notebook.nametowidget(path)
+        except KeyError:
+            return None
+        return page if page.winfo_exists() else None
+
+    def _on_tab_changed(self, _event=None):
+        selected = self.notebook.select()
+        if selected == self._current:
+            return
+        previous = self._page(self._current) if self._current else None
+        if previous is not None and hasattr(previous, "on_hide"):
+            previous.on_hide()
+        self._current = selected
+        page = self._page(selected) if selected else None
+        if page is None:
+            return
+        build = self._builders.pop(selected, None)
+        if build is not None:
+            build(page)
+        elif hasattr(page, "on_show"):
+            page.on_show()
+
+
+def get_lazy_tabs(notebook):
+    """Return the notebook's ``LazyTabs``, creating it on first use."""
+    lazy_tabs = getattr(notebook, "lazy_tabs", None)
+    if lazy_tabs is None:
+        lazy_tabs = notebook.lazy_tabs = LazyTabs(notebook)
+    return lazy_tabs
@@ -0,0 +1,69 @@
+import time
+import tkinter as tk
+
+from core.metrics import registry
+from core.watchdog import callback_name
+
+RENDERS = registry.counter("ui.renders")
+RENDERS_PER_FRAME = registry.histogram("ui.renders_per_frame", "widgets")
+FRAME_TIME = registry.histogram("ui.frame_us", "us")
+
+
+class RefreshScheduler:
+    """
+    Coalesces widget repaints into at most one pass per frame.
+
+    ``request(callback)`` marks a render callback dirty; every dirty callback
+    runs once on the next frame, however often it was requested in between.
+    Pass bound methods so repeated requests from one widget collapse.
+    """
+
+    def __init__(self, root, max_fps=60):
+        self.root = root
+        self.frame_interval = 1.0 / max(1, int(max_fps))
+        self._dirty = {}
+        self._after_id = None
+        self._last_frame = 0.0
+
+    def request(self, callback):
+        self._dirty[callback] = None
+        if self._after_id is not None:
+            return
+        delay = self._last_frame + self.frame_interval - time.monotonic()
+        if delay <= 0:
+            self._after_id = self.root.after_idle(self.flush)
+        else:
+            self._after_id = self.root.after(max(1, int(delay * 1000)), self.flush)
+
+    def flush(self):
+        """Render everything that is dirty right now."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._last_frame = time.monotonic()
+        dirty = self._dirty
+        self._dirty = {}
+        RENDERS.inc(len(dirty))
+        RENDERS_PER_FRAME.observe(len(dirty))
+        start = time.perf_counter()
+        watchdog = getattr(self.root, "stall_watchdog", None)
+        for callback in dirty:
+            try:
+                if watchdog is None:
+                    callback()
+                else:
+                    with watchdog.watch(callback_name(callback)):
+                        callback()
+            except tk.TclError:
+                pass  # widget destroyed before its frame came up
+        FRAME_TIME.observe((time.perf_counter() - start) * 1e6)
+
+
+def get_refresh_scheduler(widget):
+    """Return the scheduler shared by every widget under the same root."""
+    root = widget.nametowidget(".")
+    scheduler = getattr(root, "refresh_scheduler", None)
+    if scheduler is None:
+        scheduler = RefreshScheduler(root)
+        root.refresh_scheduler = scheduler
+    return scheduler
@@ -0,0 +1,22 @@
+def get_stall_watchdog(widget):
+    """Return the root's ``StallWatchdog``, or None when stall detection is off."""
+    return getattr(widget.nametowidget("."), "stall_watchdog", None)
+
+
+def watched_command(widget, command):
+    """Wrap a widget ``command`` so stalls it causes are attributed to it."""
+    watchdog = get_stall_watchdog(widget)
+    return command if watchdog is None else watchdog.wrap(command)
+
+
+def start_heartbeat(root, watchdog):
+    """Feed ``watchdog`` from the Tk event loop until the root is destroyed."""
+    interval_ms = max(1, int(watchdog.interval * 1000))
+
+    def beat():
+        watchdog.beat()
+        root.after(interval_ms, beat)
+
+    root.stall_watchdog = watchdog
+    watchdog.start()
+    root.after(interval_ms, beat)
@@ -1,23 +1,19 @@
 import tkinter as tk
-from tkinter import ttk
-import json
-import os
+from tkinter import filedialog, ttk
+from core import config_store
+from core.metrics import registry
 from .device_tab import create_device_tab
-from .control_panel_tab import load_preset_data
-
-def setup_settings_frame(frame, root, notebook, state_manager, control_panel=None):
-    # Load config
-    config_file = 'config.json'
-    if os.path.exists(config_file):
-        with open(config_file, 'r') as f:
-            config = json.load(f)
-        devices = config.get('devices', ['Dev1'])
-        selected_preset = config.get('selected_preset', 'default.json')
-        max_devices = config.get('max_devices', 3)
-    else:
-        devices = ['Dev1']
-        selected_preset = 'default.json'
-        max_devices = 3
+
+DIAGNOSTICS_REFRESH_MS = 1000
+DIAGNOSTICS_COLUMNS = ("count", "mean", "p50", "p95", "max")
+
+def setup_settings_frame(frame, root, notebook, state_manager, control_panel=None, config=None):
+    # Load config unless the app was started with one
+    if config is None:
+        config = config_store.load_config()
+    devices = config.get('devices', ['Dev1'])
+    selected_preset = config.get('selected_preset', 'default.json')
+    max_devices = config.get('max_devices', 3)
 
     num_devices = len(devices)
 
@@ -26,7 +22,7 @@ def setup_settings_frame(frame, root, notebook, state_manager, control_panel=Non
     preset_frame.pack(fill="x", padx=10, pady=10)
 
     ttk.Label(preset_frame, text="Select Preset:").pack(side=tk.LEFT, padx=5)
-    presets = [f for f in os.listdir('presets') if f.endswith('.json')]
+    presets = config_store.list_presets()
     preset_var = tk.StringVar(value=selected_preset)
     preset_combo = ttk.Combobox(preset_frame, textvariable=preset_var, values=presets, state="readonly")
     preset_combo.pack(side=tk.LEFT, padx=5)
@@ -89,30 +85,100 @@ def setup_settings_frame(frame, root, notebook, state_manager, control_panel=Non
         devices = [entry.get() for entry in device_entries[:num]]
         selected_preset = preset_var.get()
         print(f"Configured devices: {devices}, Preset: {selected_preset}")
-        # Save to config
-        config = {'devices': devices, 'selected_preset': selected_preset, 'max_devices': max_devices}
-        with open(config_file, 'w') as f:
-            json.dump(config, f, indent=2)
+        # Save to config, keeping keys this frame does not edit
+        new_config = dict(config_store.load_config())
+        new_config.update({'devices': devices, 'selected_preset': selected_preset, 'max_devices': max_devices})
+        config_store.save_config(new_config)
         state_manager.set_current_preset(selected_preset)
-        if control_panel is not None:
-            preset_path = os.path.join('presets', selected_preset)
-            preset_data = load_preset_data(preset_path)
-            if hasattr(control_panel, "update_preset_title"):
-                control_panel.update_preset_title(preset_data["title"])
-            if hasattr(control_panel, "update_preset_info"):
-                control_panel.update_preset_info(preset_data["info"])
-            if hasattr(control_panel, "rebuild_from_preset"):
-                control_panel.rebuild_from_preset(preset_path)
-        # Remove existing device tabs
+        if control_panel is not None and hasattr(control_panel, "rebuild_from_preset"):
+            # The rebuild also takes the title and info from the compiled preset
+            control_panel.rebuild_from_preset(config_store.selected_preset_path(new_config), devices)
+        # Keep tabs of devices that stay configured; unbuilt tabs cost nothing
+        device_tabs = {}
         for tab_id in notebook.tabs():
             tab_text = notebook.tab(tab_id, "text")
-            if tab_text not in ["Control Panel"]:
+            if tab_text in ["Control Panel"]:
+                continue
+            if tab_text in devices and tab_text not in device_tabs:
+                device_tabs[tab_text] = tab_id
+            else:
                 notebook.forget(tab_id)
-        # Add tabs for each device
-        for dev in devices:
-            create_device_tab(notebook, dev, state_manager)
+                notebook.nametowidget(tab_id).destroy()
+        # Add tabs for new devices and keep notebook order matching the config
+        for index, dev in enumerate(devices):
+            if dev not in device_tabs:
+                device_tabs[dev] = create_device_tab(
+                    notebook, dev, state_manager, getattr(control_panel, "pin_locks", None)
+                )
+            notebook.insert(index + 1, device_tabs[dev])
 
     # Apply button
     apply_frame = ttk.Frame(frame)
     apply_frame.pack(fill="x", padx=10, pady=10)
     ttk.Button(apply_frame, text="Apply Settings", command=apply_devices).pack(side=tk.RIGHT, padx=5)
+
+    setup_diagnostics_frame(frame)
+
+
+def setup_diagnostics_frame(frame):
+    """Live view of the hot-path metrics, refreshed while the settings view is open."""
+    diagnostics_frame = ttk.LabelFrame(frame, text="Diagnostics", padding=(10, 5))
+    diagnostics_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+    tree = ttk.Treeview(diagnostics_frame, columns=DIAGNOSTICS_COLUMNS, height=8)
+    tree.heading("#0", text="Metric", anchor="w")
+    tree.column("#0", width=200, stretch=True)
+    for column in DIAGNOSTICS_COLUMNS:
+        tree.heading(column, text=column, anchor="e")
+        tree.column(column, width=70, anchor="e", stretch=False)
+    tree.pack(fill="both", expand=True, pady=(0, 5))
+
+    def row_values(snapshot):
+        if snapshot["type"] == "counter":
+            return (snapshot["value"], "", "", "", "")
+        return tuple(snapshot[key] for key in DIAGNOSTICS_COLUMNS)
+
+    def render():
+        metrics = registry.snapshot()["metrics"]
+        changes = metrics.get("state.changes", {}).get("value", 0)
+        renders = metrics.get("ui.renders", {}).get("value", 0)
+        rows = [(name, row_values(snapshot), snapshot.get("unit", "")) for name, snapshot in metrics.items()]
+        # Widget refreshes caused per state change, across the whole UI
+        rows.append(("ui.renders_per_change", (round(renders / changes, 3) if changes else 0, "", "", "", ""), ""))
+        for name, values, unit in rows:
+            text = f"{name} ({unit})" if unit else name
+            if tree.exists(name):
+                tree.item(name, text=text, values=values)
+            else:
+                tree.insert("", "end", iid=name, text=text, values=values)
+
+    def refresh():
+        if not tree.winfo_exists():
+            return
+        if frame.winfo_ismapped():
+            render()
+        tree.after(DIAGNOSTICS_REFRESH_MS, refresh)
+
+    def reset():
+        registry.reset()
+        render()
+
+    def export():
+        path = filedialog.asksaveasfilename(
+            parent=frame,
+            title="Export Metrics",
+            defaultextension=".json",
+            filetypes=(("JSON", "*.json"),),
+        )
+        if path:
+            try:
+                registry.export(path)
+            except OSError as exc:
+                print(f"Failed to export metrics to {path}: {exc}")
+
+    buttons_frame = ttk.Frame(diagnostics_frame)
+    buttons_frame.pack(fill="x")
+    ttk.Button(buttons_frame, text="Export...", command=export).pack(side=tk.RIGHT, padx=5)
+    ttk.Button(buttons_frame, text="Reset", command=reset).pack(side=tk.RIGHT, padx=5)
+
+    refresh()
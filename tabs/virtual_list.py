@@ -0,0 +1,169 @@
+import bisect
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualList(ttk.Frame):
+    """
+    Scrollable column of rows that only creates widgets for the rows in view.
+
+    ``create_row(parent, item)`` builds a widget for an item and
+    ``bind_row(widget, item)`` points an existing widget at another item of
+    the same kind. Rows that scroll out of view go back to a per-kind pool,
+    after ``release_row(widget)`` lets them drop what they hold, and are
+    reused, so the widget count follows the window height rather than the
+    number of items. Row heights are measured once per kind.
+    """
+
+    def __init__(self, parent, create_row, bind_row, kind=None, row_pady=2, overscan=2, release_row=None):
+        super().__init__(parent)
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.release_row = release_row
+        self.kind = kind or (lambda item: type(item).__name__)
+        self.row_pady = row_pady
+        self.overscan = overscan
+
+        self.items = []
+        self._offsets = [0]  # y of each row's top, plus the total height
+        self._heights = {}  # kind -> measured row height
+        self._pool = {}  # kind -> idle widgets
+        self._visible = {}  # item index -> widget
+        self._top = 0
+        self._pending = None
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.canvas = tk.Canvas(self, highlightthickness=0, bd=0, width=1, height=1)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+
+        self.canvas.bind("<Configure>", lambda _event: self._schedule_render())
+        # The wheel goes to the widget under the pointer, usually a row, so
+        # the list grabs it application-wide only while the pointer is inside.
+        self.bind("<Enter>", self._grab_wheel, add="+")
+        self.bind("<Leave>", self._release_wheel, add="+")
+        self.bind("<Destroy>", lambda event: self._release_wheel() if event.widget is self else None, add="+")
+
+    def set_items(self, items):
+        """Show ``items``; visible rows are rebound in place instead of rebuilt."""
+        for index in list(self._visible):
+            self._release(index)
+        self.items = list(items)
+        self._layout()
+        self._render()
+
+    def visible_widgets(self):
+        return [(self.items[index], widget) for index, widget in sorted(self._visible.items())]
+
+    def _row_height(self, item):
+        kind = self.kind(item)
+        height = self._heights.get(kind)
+        if height is None:
+            widget = self._create(item)
+            widget.update_idletasks()
+            height = widget.winfo_reqheight() + 2 * self.row_pady
+            self._heights[kind] = height
+            self.canvas.configure(width=max(int(self.canvas.cget("width")), widget.winfo_reqwidth()))
+            self._pool_widget(widget)
+        return height
+
+    def _create(self, item):
+        widget = self.create_row(self.canvas, item)
+        widget.virtual_kind = self.kind(item)
+        return widget
+
+    def _layout(self):
+        offsets = [0]
+        for item in self.items:
+            offsets.append(offsets[-1] + self._row_height(item))
+        self._offsets = offsets
+
+    def _acquire(self, item):
+        pool = self._pool.get(self.kind(item))
+        if pool:
+            widget = pool.pop()
+            self.bind_row(widget, item)
+            return widget
+        return self._create(item)
+
+    def _release(self, index):
+        widget = self._visible.pop(index)
+        widget.place_forget()
+        self._pool_widget(widget)
+
+    def _pool_widget(self, widget):
+        if self.release_row is not None:
+            self.release_row(widget)
+        self._pool.setdefault(widget.virtual_kind, []).append(widget)
+
+    def _schedule_render(self):
+        if self._pending is None:
+            self._pending = self.after_idle(self._render)
+
+    def _render(self):
+        self._pending = None
+        view = self.canvas.winfo_height()
+        total = self._offsets[-1]
+        self._top = max(0, min(self._top, total - view))
+
+        first = max(0, bisect.bisect_right(self._offsets, self._top) - 1 - self.overscan)
+        last = min(len(self.items), bisect.bisect_left(self._offsets, self._top + view) + self.overscan)
+        for index in [index for index in self._visible if not first <= index < last]:
+            self._release(index)
+        width = self.canvas.winfo_width()
+        for index in range(first, last):
+            widget = self._visible.get(index)
+            if widget is None:
+                widget = self._visible[index] = self._acquire(self.items[index])
+            widget.place(
+                x=0,
+                y=self._offsets[index] - self._top + self.row_pady,
+                width=width,
+                height=self._offsets[index + 1] - self._offsets[index] - 2 * self.row_pady,
+            )
+
+        if total > view > 1:
+            self.scrollbar.grid(row=0, column=1, sticky="ns")
+            self.scrollbar.set(self._top / total, (self._top + view) / total)
+        else:
+            self.scrollbar.grid_remove()
+
+    def scroll_to(self, top):
+        self._top = max(0, int(top))
+        self._render()
+
+    def _on_scrollbar(self, command, *args):
+        total = self._offsets[-1]
+        view = self.canvas.winfo_height()
+        if command == "moveto":
+            self.scroll_to(float(args[0]) * total)
+        elif command == "scroll":
+            amount, unit = int(args[0]), args[1]
+            step = view if unit == "pages" else max(self._heights.values(), default=20)
+            self.scroll_to(self._top + amount * step)
+
+    def _grab_wheel(self, _event=None):
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(sequence, self._on_wheel)
+
+    def _release_wheel(self, event=None):
+        if event is not None:
+            # Leave also fires when the pointer moves onto a row inside the list
+            inside = self.winfo_containing(event.x_root, event.y_root)
+            if inside is not None and (inside is self or str(inside).startswith(str(self) + ".")):
+                return
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.unbind_all(sequence)
+
+    def _on_wheel(self, event):
+        name, canvas = str(event.widget), str(self.canvas)
+        if name != canvas and not name.startswith(canvas + "."):
+            return
+        if event.num == 4:
+            direction = -1
+        elif event.num == 5:
+            direction = 1
+        else:
+            direction = -1 if event.delta > 0 else 1
+        self._on_scrollbar("scroll", direction * 3, "units")
@@ -0,0 +1,10 @@
+import pytest
+
+from core.state_manager import StateManager
+
+
+@pytest.fixture
+def state_manager(tmp_path):
+    manager = StateManager(str(tmp_path / "state.json"), persistence="deferred")
+    yield manager
+    manager.close()
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from core.config_store import JsonFileCache, load_compiled_preset, preset_path, selected_preset_path
+from core.presets import PresetError
+
+
+def test_malformed_preset_raises_preset_error(tmp_path):
+    path = tmp_path / "broken.json"
+    path.write_text('{"controls": [')
+    with pytest.raises(PresetError) as error:
+        load_compiled_preset(str(path))
+    assert error.value.source == "broken.json"
+    assert error.value.errors[0][0] == "$"
+    assert "invalid JSON" in error.value.errors[0][1]
+
+
+def test_json_cache_reparses_only_changed_files(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text('{"devices": ["Dev1"]}')
+    cache = JsonFileCache()
+    first = cache.load(str(path))
+    assert cache.load(str(path)) is first
+    assert cache.parses == 1
+    path.write_text('{"devices": ["Dev2"]}')  # same size, so only the mtime tells
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.load(str(path)) == {"devices": ["Dev2"]}
+    assert cache.parses == 2
+    path.unlink()
+    assert cache.load(str(path)) == {}
+
+
+def test_preset_names_resolve_inside_the_presets_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "default.json").write_text("{}")  # must not shadow presets/default.json
+    assert preset_path("default.json") == os.path.join("presets", "default.json")
+    assert selected_preset_path({}) == preset_path("default.json")
+    assert selected_preset_path({"selected_preset": "a.json"}) == preset_path("a.json")
@@ -0,0 +1,54 @@
+import time
+
+from core.engine import SequenceEngine
+from core.hardware import SimulatedBackend
+from core.sequence import compile_sequence
+from core.state_manager import StateManager
+
+
+def sequence(label, pin, seconds):
+    return compile_sequence(label, [
+        {"action": "set", "device": "Dev1", "pin": pin, "state": True},
+        {"action": "wait", "seconds": seconds},
+    ])
+
+
+def test_engine_waits_out_a_trailing_wait(state_manager):
+    report = SequenceEngine(state_manager).run_sequence(sequence("seq", "p2.0", 0.2))
+    assert report.outcome == "completed"
+    assert report.duration >= 0.2
+
+
+def test_engine_serializes_sequences_sharing_a_pin(state_manager):
+    spans = {}
+
+    def log(message, event_type="sequence", **_fields):
+        if message.startswith("Sequence started: "):
+            spans[message.split(": ", 1)[1]] = [time.monotonic(), None]
+        elif message.startswith("Sequence finished: "):
+            spans[message.split(": ", 1)[1].split(" (")[0]][1] = time.monotonic()
+
+    engine = SequenceEngine(state_manager, log_callback=log)
+    reports = engine.run_parallel([sequence("a", "p2.0", 0.2), sequence("b", "p2.0", 0.2), sequence("c", "p2.1", 0.2)])
+    assert [report.outcome for report in reports] == ["completed"] * 3
+    first, second = sorted([spans["a"], spans["b"]])
+    assert first[1] <= second[0]  # a and b share p2.0, so they never overlap
+    assert spans["c"][0] < first[1]  # c runs alongside whichever goes first
+
+
+def test_group_apply_reasserts_drifted_hardware(tmp_path):
+    hardware = SimulatedBackend()
+    manager = StateManager(str(tmp_path / "state.json"), persistence="deferred", hardware=hardware)
+    manager.write_port("Dev1", 0, 0x0F)
+    hardware.write_port("Dev1", 0, 0x00)  # the device lost its outputs
+    notified = []
+    manager.register_update_callback(notified.append)
+
+    class Group:
+        label = "group"
+        port_masks = {("Dev1", 0): (0xFF, 0x0F)}
+
+    SequenceEngine(manager).apply_group(Group())
+    assert hardware.read_port("Dev1", 0) == 0x0F
+    assert notified == []
+    manager.close()
@@ -0,0 +1,12 @@
+from core.event_log import EventLog
+
+
+def test_event_log_query_and_capacity(tmp_path):
+    event_log = EventLog(capacity=3)
+    for index in range(5):
+        event_log.record("pin_change", f"change {index}", "Dev1", "p0.0")
+    event_log.record("info", "hello")
+    assert len(event_log) == 3
+    assert [record.message for record in event_log.query(event_type="pin_change")] == ["change 3", "change 4"]
+    assert event_log.export(str(tmp_path / "events.jsonl")) == 3
+    event_log.close()
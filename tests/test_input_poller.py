@@ -0,0 +1,26 @@
+from core.hardware import SimulatedBackend
+from core.input_poller import InputPoller
+
+
+class FlakyBackend(SimulatedBackend):
+    failing = False
+
+    def read_port(self, device, port):
+        if self.failing:
+            raise OSError("device unplugged")
+        return super().read_port(device, port)
+
+
+def test_read_failures_are_logged_on_transition_only(state_manager):
+    hardware = FlakyBackend()
+    logged = []
+    poller = InputPoller(state_manager, hardware, log_callback=lambda message, **_fields: logged.append(message))
+    hardware.failing = True
+    for _ in range(3):
+        poller._sample("Dev1", 0)
+    hardware.failing = False
+    poller._sample("Dev1", 0)
+    poller._sample("Dev1", 0)
+    assert logged == []  # delivered on the UI thread
+    poller.drain()
+    assert logged == ["Input read failed for Dev1/port0: device unplugged", "Input read recovered for Dev1/port0"]
@@ -0,0 +1,86 @@
+import json
+import socket
+import time
+
+import pytest
+
+from core.rpc_server import RpcServer
+from core.state_manager import StateManager
+
+
+@pytest.fixture
+def state_manager(tmp_path):
+    manager = StateManager(str(tmp_path / "state.json"), persistence="deferred")
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def server(state_manager):
+    rpc_server = RpcServer(state_manager, "127.0.0.1:0")
+    rpc_server.start()
+    yield rpc_server
+    rpc_server.stop()
+
+
+def connect(rpc_server):
+    host, port = rpc_server.bound_address()[len("tcp://"):].rsplit(":", 1)
+    sock = socket.create_connection((host, int(port)), timeout=5)
+    return sock, sock.makefile("rwb")
+
+
+def send(stream, *requests):
+    for request in requests:
+        stream.write((json.dumps(request) + "\n").encode("utf-8"))
+    stream.flush()
+
+
+def wait_for_queue(rpc_server, size):
+    deadline = time.monotonic() + 5
+    while rpc_server.requests.qsize() < size:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_replies_keep_request_order_around_errors(server, state_manager):
+    sock, stream = connect(server)
+    send(
+        stream,
+        {"id": 1, "method": "set", "params": {"device": "Dev1", "pin": "p0.1", "value": True}},
+        {"id": 2, "method": "set", "params": {"device": "Dev1", "pin": "p9.9", "value": True}},
+        {"id": 3, "method": "get", "params": {"device": "Dev1", "pin": "p0.1"}},
+        {"id": 4, "method": "nope"},
+    )
+    wait_for_queue(server, 4)
+    assert server.drain() == 4
+    replies = [json.loads(stream.readline()) for _ in range(4)]
+    sock.close()
+    assert [reply["id"] for reply in replies] == [1, 2, 3, 4]
+    assert "error" in replies[1] and "error" in replies[3]
+    assert replies[2]["result"] is True
+    assert state_manager.get_pin_state("Dev1", "p0.1") is True
+
+
+def test_queued_writes_apply_as_one_batch(server, state_manager):
+    changes = []
+    state_manager.register_update_callback(changes.append)
+    sock, stream = connect(server)
+    send(stream, *[
+        {"id": bit, "method": "set", "params": {"device": "Dev1", "pin": f"p1.{bit}", "value": True}}
+        for bit in range(8)
+    ])
+    wait_for_queue(server, 8)
+    server.drain()
+    replies = [json.loads(stream.readline()) for _ in range(8)]
+    sock.close()
+    assert [reply["id"] for reply in replies] == list(range(8))
+    assert len(changes) == 1
+    assert state_manager.read_port("Dev1", 1) == 0xFF
+
+
+def test_unix_address_refuses_to_replace_a_regular_file(state_manager, tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("{}")
+    with pytest.raises(ValueError):
+        RpcServer(state_manager, f"unix:{path}").start()
+    assert path.read_text() == "{}"
@@ -0,0 +1,29 @@
+import pytest
+
+from core.sequence import SequenceError, compile_sequence
+
+
+def test_compile_sequence_merges_consecutive_sets():
+    plan = compile_sequence("seq", [
+        {"action": "set", "device": "Dev1", "pin": "p0.0", "state": True},
+        {"action": "set", "device": "Dev1", "pin": "p0.1", "state": True},
+        {"action": "wait", "seconds": 0.1},
+    ])
+    assert [step.action for step in plan.steps] == ["set", "wait"]
+    assert plan.steps[0].port_masks == {("Dev1", 0): (0b11, 0b11)}
+    assert plan.write_pins == {("Dev1", "p0.0"), ("Dev1", "p0.1")}
+
+
+def test_compile_sequence_names_the_failing_step():
+    with pytest.raises(SequenceError) as error:
+        compile_sequence("seq", [{"action": "wait", "seconds": 1}, {"action": "set", "device": "Dev1", "pin": "p3.0"}],
+                         path="$.steps")
+    assert error.value.where == "$.steps[1].pin"
+
+
+def test_compiled_plan_is_read_only():
+    plan = compile_sequence("seq", [{"action": "set", "device": "Dev1", "pin": "p0.0", "state": True}])
+    with pytest.raises(AttributeError):
+        plan.label = "other"
+    with pytest.raises(TypeError):
+        plan.steps[0].port_masks[("Dev1", 1)] = (0xFF, 0)
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from core.hardware import SimulatedBackend
+from core.state_manager import StateManager
+
+
+def test_journal_replay_matches_live_state(tmp_path):
+    path = str(tmp_path / "state.json")
+    writer = StateManager(path, storage="journal")
+    for index in range(50):
+        writer.set_pin_state("Dev1", f"p{index % 3}.{index % 8}", index % 2 == 0)
+    writer.write_port("Dev2", 1, 0xA5)
+    # Read back before the writer compacts, as after a crash
+    reader = StateManager(path, storage="journal")
+    assert reader.state == writer.state
+    reader.close()
+    writer.close()
+    assert os.path.exists(path)
+    assert StateManager(path).state == writer.state
+
+
+def test_set_many_notifies_once(state_manager):
+    calls = []
+    state_manager.subscribe([("Dev1", "p0.0"), ("Dev1", "p1.2")], calls.append)
+    state_manager.set_many([("Dev1", "p0.0", True), ("Dev1", "p1.2", True), ("Dev1", "p2.7", True)])
+    assert len(calls) == 1
+    assert sorted(calls[0]) == [("Dev1", "p0.0", True), ("Dev1", "p1.2", True)]
+    assert state_manager.read_port("Dev1", 2) == 0x80
+
+
+def test_startup_drives_restored_outputs_only(tmp_path):
+    path = str(tmp_path / "state.json")
+    saved = StateManager(path)
+    saved.write_port("Dev1", 0, 0x0F)
+    saved.write_port("Dev1", 1, 0x33)
+    saved.write_port("Dev1", 2, 0xF0)
+    saved.close()
+    hardware = SimulatedBackend()
+    hardware.write_port("Dev1", 0, 0x0F)  # already matches
+    writes = hardware.writes
+    manager = StateManager(path, hardware=hardware, input_ports=[("Dev1", 1)])
+    assert hardware.writes == writes + 1
+    assert hardware.read_port("Dev1", 1) == 0
+    assert hardware.read_port("Dev1", 2) == 0xF0
+    manager.close()
+
+
+def test_failed_save_keeps_the_previous_file(tmp_path, monkeypatch):
+    path = tmp_path / "state.json"
+    manager = StateManager(str(path))
+    manager.set_pin_state("Dev1", "p0.0", True)
+    before = path.read_text()
+
+    def fail(*_args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        manager.set_pin_state("Dev1", "p0.1", True)
+    assert path.read_text() == before
+    assert [entry.name for entry in tmp_path.iterdir()] == ["state.json"]
+
+
+def test_deferred_saves_coalesce(tmp_path):
+    manager = StateManager(str(tmp_path / "state.json"), persistence="deferred", flush_interval=10)
+    saves = []
+    write_snapshot = manager._write_snapshot
+    manager._write_snapshot = lambda fsync=False: (saves.append(fsync), write_snapshot(fsync))
+    for index in range(100):
+        manager.set_pin_state("Dev1", f"p0.{index % 8}", index % 2 == 0)
+    assert manager.flush(timeout=5)
+    assert len(saves) == 1
+    assert StateManager(str(tmp_path / "state.json")).state == manager.state
+    manager.close()
+
+
+def test_failed_deferred_save_is_retried(tmp_path):
+    manager = StateManager(str(tmp_path / "state.json"), persistence="deferred", flush_interval=10)
+    write_snapshot = manager._write_snapshot
+    attempts = []
+
+    def flaky(fsync=False):
+        attempts.append(fsync)
+        if len(attempts) == 1:
+            raise OSError("disk full")
+        write_snapshot(fsync)
+
+    manager._write_snapshot = flaky
+    manager.set_pin_state("Dev1", "p0.0", True)
+    assert not manager.flush(timeout=5)
+    assert manager.flush(timeout=5)
+    manager.close()
+    assert StateManager(str(tmp_path / "state.json")).get_pin_state("Dev1", "p0.0")
+
+
+@pytest.mark.parametrize("persistence", ["immediate", "deferred"])
+def test_close_writes_and_syncs(tmp_path, monkeypatch, persistence):
+    path = str(tmp_path / "state.json")
+    manager = StateManager(path, persistence=persistence, flush_interval=10, fsync="close")
+    manager.set_pin_state("Dev1", "p1.3", True)
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(fd), fsync(fd)))
+    manager.close()
+    manager.close()
+    assert synced
+    assert StateManager(path).get_pin_state("Dev1", "p1.3")